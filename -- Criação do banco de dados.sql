@@ -18,6 +18,7 @@ CREATE TABLE Seller (
     id_seller INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     fk_fornecedor INT NOT NULL,
+    UNIQUE KEY uk_seller_name_fornecedor (name, fk_fornecedor),
     FOREIGN KEY (fk_fornecedor) REFERENCES Fornecedores(id_fornecedor)
 );
 
@@ -52,3 +53,9 @@ CREATE TABLE List (
     FOREIGN KEY (fk_seller) REFERENCES Seller(id_seller),
     FOREIGN KEY (fk_fornecedor) REFERENCES Fornecedores(id_fornecedor)
 );
+
+-- ================================
+-- Migração (bancos criados antes do uk_seller_name_fornecedor)
+-- ================================
+-- Remova antes os Sellers duplicados por (name, fk_fornecedor), se houver:
+-- ALTER TABLE Seller ADD UNIQUE KEY uk_seller_name_fornecedor (name, fk_fornecedor);
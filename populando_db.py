@@ -1,15 +1,25 @@
 import os
 import re
+import argparse
 import glob
-import math
 import hashlib
+import sqlite3
+import tempfile
+import time
+import unicodedata
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Connection, Engine
+try:
+    import pyarrow  # noqa: F401  multithreaded CSV reader + parquet cache of the xlsx inputs
+    USE_PYARROW = True
+except Exception:
+    USE_PYARROW = False
 
 
 # =========================
@@ -22,113 +32,108 @@ MYSQL_PORT="3306"
 MYSQL_DB="ecommerce_scraping"
 input_files="./db"
 GLOBS = ["produtos_scrape_*.xlsx"]
+BATCH_SIZE = 5000  # linhas de List por INSERT multi-VALUES
+# cross-run memo of the dimension ids, one file per server/database ('' or --no-cache disables, --rebuild-cache resets)
+ID_CACHE_PATH = os.path.expanduser(f"~/.cache/scrape_ids_{MYSQL_HOST}_{MYSQL_PORT}_{MYSQL_DB}.sqlite")
+ID_CACHE_TTL_DAYS = 30
+# parquet copies of the decoded xlsx inputs (outside ./db, which is tracked data)
+XLSX_CACHE_DIR = os.path.expanduser("~/.cache/scrape_xlsx")
 
 # =========================
-# UTILS
+# REGEX (compiled once)
 # =========================
-def slugify(s: str, max_len: int = 100) -> str:
-    s = s.strip().lower()
-    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE)
-    s = re.sub(r"[\s_-]+", "-", s).strip("-")
-    return s[:max_len]
-
-def parse_price(value) -> Optional[float]:
-    if value is None or (isinstance(value, float) and math.isnan(value)):
-        return None
-    if isinstance(value, (int, float)):
-        return round(float(value), 2)
-    s = str(value).strip()
-    s = s.replace("R$", "").replace(".", "").replace(" ", "")
-    s = s.replace(",", ".")
-    try:
-        return round(float(s), 2)
-    except:
-        return None
-
-def parse_avaliacao(value) -> Optional[float]:
-    import re, math
-    if value is None:
-        return None
-    if isinstance(value, float) and math.isnan(value):
-        return None
-
-    s = str(value).strip().lower()
-
-    # Se parecer contagem ("27 avaliações") e NÃO houver escala, trata como None
-    if "avaliaç" in s and ("de 5" not in s and "/5" not in s):
-        return None
-
-    # Padrão explícito "x de 5" ou "x/5"
-    m = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:de|/)\s*5\b", s)
-    if m:
-        try:
-            v = float(m.group(1).replace(",", "."))
-            return round(v, 2) if 0 <= v <= 5 else None
-        except:
-            return None
+_SLUG_NONWORD = re.compile(r"[^\w\s-]", re.UNICODE)
+_SLUG_SEP = re.compile(r"[\s_-]+")
+_AVAL_SCALE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:de|/)\s*5\b")
+_AVAL_NUM = re.compile(r"\b(\d+(?:[.,]\d+)?)\b")
+_STORAGE = re.compile(r"\b(\d{2,4}\s?GB)\b", re.IGNORECASE)
+_COLOR = re.compile(r"\b(preto|black|azul|blue|verde|green|branco|white|cinza|gray|graphite|violet|violeta|pink|rosa)\b", re.IGNORECASE)
+_WS = re.compile(r"\s+")
+_WS2 = re.compile(r"\s{2,}")
+_SPLIT_MODEL = re.compile(r"[-|,(]")
+_PRICE_CLEAN = re.compile(r"R\$|\.|\s")  # currency, thousands dots and any whitespace in one pass
 
-    # Número solto (ex.: "4,3")
-    m = re.search(r"\b(\d+(?:[.,]\d+)?)\b", s)
-    if m:
-        try:
-            v = float(m.group(1).replace(",", "."))
-            # Ratings devem estar entre 0 e 5; fora disso, considere inválido
-            return round(v, 2) if 0 <= v <= 5 else None
-        except:
-            return None
-
-    return None
+# =========================
+# UTILS
+# =========================
+def name_key(s: str) -> str:
+    """Comparison key matching MySQL's utf8mb4_0900_ai_ci collation: case- and accent-insensitive."""
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(c for c in s if not unicodedata.combining(c)).casefold()
+
+def slugify_series(s: pd.Series, max_len: int = 100) -> pd.Series:
+    """Lowercase, strip non-word chars and join words with '-', over a whole column as Series.str passes."""
+    return (s.astype(str).str.strip().str.lower()
+             .str.replace(_SLUG_NONWORD, "", regex=True)
+             .str.replace(_SLUG_SEP, "-", regex=True)
+             .str.strip("-").str.slice(0, max_len))
+
+def parse_price_series(s: pd.Series) -> pd.Series:
+    """Parse BR prices to float: numeric columns go straight through to_numeric, text columns
+    through str ops in C; mixed-type object columns are split into numbers and text, each taking its own path."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return pd.to_numeric(s, errors="coerce").round(2)
+    if pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+        is_txt = s.map(type).eq(str)
+        num = pd.to_numeric(s.where(~is_txt), errors="coerce").round(2)
+        return num.where(~is_txt, parse_price_series(s.where(is_txt)))
+    txt = s.str.replace(_PRICE_CLEAN, "", regex=True).str.replace(",", ".", regex=False)
+    return pd.to_numeric(txt, errors="coerce").round(2)
+
+def parse_avaliacao_series(s: pd.Series) -> pd.Series:
+    """Extract a 0..5 rating ('x de 5' / 'x/5' first, else a loose number); counts like '27 avaliações' become NaN."""
+    txt = s.astype(str).str.strip().str.lower()
+    count_only = (txt.str.contains("avaliaç", regex=False)
+                  & ~txt.str.contains("de 5", regex=False) & ~txt.str.contains("/5", regex=False))
+    raw = txt.str.extract(_AVAL_SCALE, expand=False)
+    raw = raw.fillna(txt.str.extract(_AVAL_NUM, expand=False))
+    v = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+    return v.where(v.between(0, 5) & ~count_only).round(2)
+
+def parse_created_at(s: pd.Series) -> pd.Series:
+    """Parses collection timestamps as ISO first (the scraper writes '%Y-%m-%d %H:%M:%S');
+    only values that fail go through pandas' format inference."""
+    ts = pd.to_datetime(s, errors="coerce", format="ISO8601")
+    bad = ts.isna() & s.notna()
+    if bad.any():
+        ts.loc[bad] = pd.to_datetime(s[bad], errors="coerce")
+    return ts
 
 
 BRANDS = [
     "Apple", "Samsung", "Motorola", "Xiaomi", "Nokia", "Asus", "Google", "Sony",
     "LG", "Realme", "OnePlus", "Huawei", "Infinix", "OPPO", "Vivo", "Lenovo"
 ]
+_BRAND_SPLIT = {b: re.compile(rf"\b{re.escape(b)}\b", re.IGNORECASE) for b in BRANDS}
 
-def extract_product_fields(produto: str) -> Tuple[str, str, str]:
+def extract_product_fields_vec(produtos: pd.Series) -> pd.DataFrame:
     """
-    Very simple heuristics:
-      - brand: first known brand substring found (case-insensitive)
+    Very simple heuristics, one C-level pass per pattern over the whole column:
+      - brand: first known brand found as a whole word (case-insensitive, BRANDS order)
       - model: first sequence after brand up to first " - | , (" or storage marker
       - variant: storage/color if present (e.g., 128GB / 256GB, color words)
+    Returns brand/model/variant columns.
     """
-    if not produto:
-        return ("Desconhecida", produto or "", "")
-    brand = "Desconhecida"
-    p = produto.strip()
-
-    found = None
-    for b in BRANDS:
-        if re.search(rf"\b{re.escape(b)}\b", p, flags=re.IGNORECASE):
-            found = b
-            break
-    if found:
-        brand = found
-
-    # Extract variant hints (storage or color words)
-    variant_parts = []
-    storage = re.findall(r"\b(\d{2,4}\s?GB)\b", p, flags=re.IGNORECASE)
-    if storage:
-        variant_parts.append(storage[0].upper())
-
-    color = re.findall(r"\b(preto|black|azul|blue|verde|green|branco|white|cinza|gray|graphite|violet|violeta|pink|rosa)\b", p, flags=re.IGNORECASE)
-    if color:
-        variant_parts.append(color[0].capitalize())
-
-    variant = " ".join(dict.fromkeys(variant_parts)) if variant_parts else ""
-
-    # basic model extraction: remove brand and common filler tokens
-    model = p
-    if found:
-        model = re.split(rf"\b{re.escape(found)}\b", p, flags=re.IGNORECASE, maxsplit=1)[-1].strip()
-    model = re.split(r"[-|,(]", model)[0].strip()
-    # compress redundant spaces
-    model = re.sub(r"\s{2,}", " ", model)
-
-    # If model is too short or equals to product, fallback
-    if not model or len(model) < 3:
-        model = p
-    return (brand, model[:255], variant[:255])
+    p = produtos.fillna("").astype(str).str.strip()
+
+    # reversed so that the first brand in BRANDS order wins
+    brand = pd.Series("Desconhecida", index=p.index)
+    for b in reversed(BRANDS):
+        brand = brand.mask(p.str.contains(_BRAND_SPLIT[b]), b)
+
+    storage = p.str.extract(_STORAGE, expand=False).str.upper().fillna("")
+    color = p.str.extract(_COLOR, expand=False).str.capitalize().fillna("")
+    variant = (storage + " " + color).str.strip()
+
+    model = p.copy()
+    for b in brand.unique():
+        if b == "Desconhecida":
+            continue
+        m = brand.eq(b)
+        model[m] = p[m].str.split(_BRAND_SPLIT[b], n=1, regex=True).str[-1].str.strip()
+    model = model.str.split(_SPLIT_MODEL, n=1, regex=True).str[0].str.strip().str.replace(_WS2, " ", regex=True)
+    model = model.where(model.str.len() >= 3, p)
+    return pd.DataFrame({"brand": brand, "model": model.str[:255], "variant": variant.str[:255]})
 
 @dataclass
 class RowNormalized:
@@ -163,15 +168,15 @@ def normalize_df(df: pd.DataFrame) -> pd.DataFrame:
 
     # Compose price if numeric not provided
     if "price_num" in df.columns:
-        df["price"] = df["price_num"].apply(parse_price)
+        df["price"] = parse_price_series(df["price_num"])
     else:
-        df["price"] = df.get("preco_texto", pd.Series([None]*len(df))).apply(parse_price)
+        df["price"] = parse_price_series(df.get("preco_texto", pd.Series([None]*len(df))))
 
     # Parse evaluation
-    df["avaliacao_val"] = df.get("avaliacao", pd.Series([None]*len(df))).apply(parse_avaliacao)
+    df["avaliacao_val"] = parse_avaliacao_series(df.get("avaliacao", pd.Series([None]*len(df))))
 
     # Frete
-    df["frete_price_val"] = df.get("frete_price", pd.Series([None]*len(df))).apply(parse_price)
+    df["frete_price_val"] = parse_price_series(df.get("frete_price", pd.Series([None]*len(df))))
 
     # Fornecedor and Seller
     df["fornecedor_name"] = df.get("fornecedor") if "fornecedor" in df.columns else df.get("fonte_coluna")
@@ -181,7 +186,7 @@ def normalize_df(df: pd.DataFrame) -> pd.DataFrame:
     if "created_at" in df.columns:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            df["created_at_ts"] = pd.to_datetime(df["created_at"], errors="coerce")
+            df["created_at_ts"] = parse_created_at(df["created_at"])
     else:
         df["created_at_ts"] = pd.Timestamp.utcnow()
 
@@ -204,80 +209,235 @@ def get_engine() -> Engine:
     uri = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
     return create_engine(uri, pool_pre_ping=True)
 
-def get_or_create_fornecedor(engine: Engine, name: str) -> int:
-    code = slugify(name)
-    with engine.begin() as conn:
-        # try select by code
-        row = conn.execute(text("SELECT id_fornecedor FROM Fornecedores WHERE code=:code"), {"code": code}).fetchone()
-        if row:
-            return row[0]
-        conn.execute(
-            text("INSERT INTO Fornecedores (name, code) VALUES (:name, :code)"),
-            {"name": name.strip()[:255], "code": code[:100]}
-        )
-        row = conn.execute(text("SELECT id_fornecedor FROM Fornecedores WHERE code=:code"), {"code": code}).fetchone()
-        return row[0]
-
-def get_or_create_seller(engine: Engine, name: str, fk_fornecedor: int) -> int:
-    # we don't have a uniqueness; approximate by pair (name, fk_fornecedor)
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("""SELECT id_seller FROM Seller 
-                    WHERE name=:name AND fk_fornecedor=:fk"""),
-            {"name": name.strip()[:255], "fk": fk_fornecedor}
-        ).fetchone()
-        if row:
-            return row[0]
-        conn.execute(
-            text("""INSERT INTO Seller (name, fk_fornecedor) VALUES (:name, :fk)"""),
-            {"name": name.strip()[:255], "fk": fk_fornecedor}
-        )
-        row = conn.execute(
-            text("""SELECT id_seller FROM Seller 
-                    WHERE name=:name AND fk_fornecedor=:fk"""),
-            {"name": name.strip()[:255], "fk": fk_fornecedor}
-        ).fetchone()
-        return row[0]
-
-def get_or_create_product(engine: Engine, produto: str) -> int:
-    brand, model, variant = extract_product_fields(produto)
+# statements parsed once at import; callers pass a Connection and own the transaction
+SQL_ALL_FORN = text("SELECT code, id_fornecedor FROM Fornecedores")
+SQL_ALL_SELLER = text("SELECT name, fk_fornecedor, id_seller FROM Seller")
+SQL_ALL_PROD = text("SELECT code, id_product FROM Products")
+SQL_FORN_BY_IDS = text("SELECT code, id_fornecedor FROM Fornecedores WHERE id_fornecedor IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+SQL_SELLER_BY_IDS = text("SELECT name, fk_fornecedor, id_seller FROM Seller WHERE id_seller IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+SQL_PROD_BY_IDS = text("SELECT code, id_product FROM Products WHERE id_product IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+SQL_FORN_BY_CODES = text("SELECT code, id_fornecedor FROM Fornecedores WHERE code IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+SQL_SELLER_BY_NAMES = text("SELECT name, fk_fornecedor, id_seller FROM Seller WHERE name IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+SQL_PROD_BY_CODES = text("SELECT code, id_product FROM Products WHERE code IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+# Fornecedores.code / Products.code are UNIQUE: the executemany upsert is a no-op for codes MySQL
+# already has, and the ids are read back by code afterwards
+SQL_INS_FORN = text("""INSERT INTO Fornecedores (name, code) VALUES (:name, :code)
+                       ON DUPLICATE KEY UPDATE id_fornecedor=LAST_INSERT_ID(id_fornecedor)""")
+SQL_INS_SELLER = text("""INSERT INTO Seller (name, fk_fornecedor) VALUES (:name, :fk)""")
+SQL_INS_PROD = text("""INSERT INTO Products (brand, code, model, variante) 
+                       VALUES (:brand, :code, :model, :var)
+                       ON DUPLICATE KEY UPDATE id_product=LAST_INSERT_ID(id_product)""")
+
+# in-process caches (this script is the only writer during ingest): key -> PK; fornecedores by name_key(code),
+# sellers by (name_key, fk)
+_forn_cache: Dict[str, int] = {}
+_seller_cache: Dict[Tuple[str, int], int] = {}
+_prod_cache: Dict[str, int] = {}
+
+def warm_caches(conn: Connection) -> None:
+    """Loads the existing dimension rows once, so known entities never hit MySQL in the loop."""
+    _forn_cache.update((name_key(code), pk) for code, pk in conn.execute(SQL_ALL_FORN).fetchall())
+    _seller_cache.update(((name_key(name), fk), pk) for name, fk, pk in conn.execute(SQL_ALL_SELLER).fetchall())
+    _prod_cache.update(conn.execute(SQL_ALL_PROD).fetchall())
+
+def _select_in(conn: Connection, stmt, keys) -> list:
+    """Runs a `... IN :keys` lookup in BATCH_SIZE slices (only the keys this run is missing)."""
+    keys, rows = list(keys), []
+    for i in range(0, len(keys), BATCH_SIZE):
+        rows.extend(conn.execute(stmt, {"keys": keys[i:i + BATCH_SIZE]}).fetchall())
+    return rows
+
+def _drop_stale(conn: Connection, cache: dict, keys, stmt, key_of) -> None:
+    """Re-checks this run's memo hits against MySQL: ids that are gone or now belong to another key
+    (rows deleted/merged, database recreated) are dropped, so those keys take the miss path."""
+    hits = {k: cache[k] for k in keys if k in cache}
+    if not hits:
+        return
+    live = {row[-1]: key_of(row) for row in _select_in(conn, stmt, set(hits.values()))}
+    for k, pk in hits.items():
+        if live.get(pk) != k:
+            del cache[k]
+
+class IdCache:
+    """sqlite memo of the dimension ids across runs; entries not used for ttl_days are dropped."""
+    def __init__(self, path: str, ttl_days: float = ID_CACHE_TTL_DAYS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS ids (kind TEXT NOT NULL, key TEXT NOT NULL, fk INTEGER NOT NULL,
+                              id INTEGER NOT NULL, seen_at REAL NOT NULL, PRIMARY KEY (kind, key, fk))""")
+        self._conn.execute("DELETE FROM ids WHERE seen_at < ?", (time.time() - ttl_days * 86400,))
+        self._conn.commit()
+        self._known = (set(), set(), set())
+        self._used = (set(), set(), set())
+
+    def load(self) -> bool:
+        """Fills the in-process caches; False when nothing is memoized yet."""
+        rows = self._conn.execute("SELECT kind, key, fk, id FROM ids").fetchall()
+        for kind, key, fk, pk in rows:
+            if kind == "f": _forn_cache[key] = pk
+            elif kind == "s": _seller_cache[(key, fk)] = pk
+            else: _prod_cache[key] = pk
+        self._known = (set(_forn_cache), set(_seller_cache), set(_prod_cache))
+        return bool(rows)
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM ids")
+        self._conn.commit()
+        self._known = (set(), set(), set())
+
+    def mark_used(self, forn_keys, seller_keys, prod_keys) -> None:
+        """Keys this run resolved; save() refreshes their seen_at so entries in use never expire."""
+        for used, keys in zip(self._used, (forn_keys, seller_keys, prod_keys)):
+            used.update(keys)
+
+    def save(self) -> None:
+        """Persists what this run learned or used (call only after the MySQL transaction committed)."""
+        now, (kf, ks, kp), (uf, us, up) = time.time(), self._known, self._used
+        rows = [("f", k, 0, v, now) for k, v in _forn_cache.items() if k not in kf or k in uf]
+        rows += [("s", n, fk, v, now) for (n, fk), v in _seller_cache.items() if (n, fk) not in ks or (n, fk) in us]
+        rows += [("p", k, 0, v, now) for k, v in _prod_cache.items() if k not in kp or k in up]
+        self._conn.executemany("INSERT OR REPLACE INTO ids (kind, key, fk, id, seen_at) VALUES (?, ?, ?, ?, ?)", rows)
+        self._conn.commit()
+        self._known = (set(_forn_cache), set(_seller_cache), set(_prod_cache))
+        self._used = (set(), set(), set())
+
+    def close(self) -> None:
+        self._conn.close()
+
+def product_code(produto: str) -> str:
     # product code: stable hash of normalized product string
-    norm = re.sub(r"\s+", " ", produto.strip().lower())
+    norm = _WS.sub(" ", produto.strip().lower())
     code_raw = hashlib.sha1(norm.encode("utf-8")).hexdigest()[:20]
-    code = f"p_{code_raw}"
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT id_product FROM Products WHERE code=:code"), {"code": code}).fetchone()
-        if row:
-            return row[0]
-        conn.execute(
-            text("""INSERT INTO Products (brand, code, model, variante) 
-                    VALUES (:brand, :code, :model, :var)"""),
-            {"brand": brand[:255], "code": code[:100], "model": model[:255], "var": variant[:255]}
-        )
-        row = conn.execute(text("SELECT id_product FROM Products WHERE code=:code"), {"code": code}).fetchone()
-        return row[0]
-
-def insert_list_row(engine: Engine, url: Optional[str], price: Optional[float], avaliacao: Optional[float],
-                    frete_price: Optional[float], prazo_entrega: Optional[str], created_at, 
-                    fk_product: int, fk_seller: int, fk_fornecedor: int) -> None:
-    with engine.begin() as conn:
-        conn.execute(
-            text("""INSERT INTO List 
-                (url, price, avaliacao, frete_price, prazo_entrega, created_at, fk_product, fk_seller, fk_fornecedor)
-                VALUES (:url, :price, :avaliacao, :frete_price, :prazo, :created_at, :fk_product, :fk_seller, :fk_fornecedor)
-            """),
-            {
-                "url": (url or "")[:500],
-                "price": price if price is not None else None,
-                "avaliacao": avaliacao if avaliacao is not None else None,
-                "frete_price": frete_price if frete_price is not None else None,
-                "prazo": (prazo_entrega or "")[:100] if prazo_entrega else None,
-                "created_at": pd.to_datetime(created_at) if created_at is not None else None,
-                "fk_product": fk_product,
-                "fk_seller": fk_seller,
-                "fk_fornecedor": fk_fornecedor,
-            }
-        )
+    return f"p_{code_raw}"
+
+def product_codes(produtos: pd.Series) -> pd.Series:
+    """Hashes each distinct product name once and maps the codes back onto every row."""
+    uniq = produtos.drop_duplicates()
+    return produtos.map(dict(zip(uniq, map(product_code, uniq))))
+
+def resolve_dimension_ids(conn: Connection, norm: pd.DataFrame, id_cache: Optional[IdCache] = None) -> pd.DataFrame:
+    """Bulk get-or-create of the dimensions: stages the distinct fornecedores/sellers/products, inserts only the ones
+    not known yet (one executemany per table) and maps the ids back as fk_* columns.
+    With id_cache the known ids come from the on-disk memo instead of full-table SELECTs; the memo
+    hits of this batch are re-checked by id before use."""
+    forn = norm["fornecedor_name"].astype(str).str.strip()
+    has_seller = norm["seller_name"].notna() & norm["seller_name"].astype(str).str.strip().ne("")
+    seller = norm["seller_name"].where(has_seller, forn).astype(str).str.strip().str[:255]
+    produto = norm["produto"].astype(str).str.strip()
+    from_memo = id_cache is not None and id_cache.load()
+    if not from_memo:
+        for cache in (_forn_cache, _seller_cache, _prod_cache):
+            cache.clear()
+        warm_caches(conn)
+
+    # Fornecedores (the sellers need their ids)
+    forn_code = slugify_series(forn)
+    forn_key = forn_code.map({c: name_key(c) for c in forn_code.unique()})  # codes compare like names in MySQL
+    if from_memo:
+        _drop_stale(conn, _forn_cache, set(forn_key), SQL_FORN_BY_IDS, lambda row: name_key(row[0]))
+    f_stage = pd.DataFrame({"name": forn.str[:255], "code": forn_code, "key": forn_key}).drop_duplicates("key")
+    f_new = f_stage[~f_stage["key"].isin(list(_forn_cache))][["name", "code"]].to_dict("records")
+    if f_new:
+        conn.execute(SQL_INS_FORN, f_new)  # upsert: also fine for codes MySQL already has
+        _forn_cache.update((name_key(code), pk) for code, pk in _select_in(conn, SQL_FORN_BY_CODES, [r["code"] for r in f_new]))
+    fk_fornecedor = forn_key.map(_forn_cache)
+
+    # Seller + Products
+    s_keys = list(zip(seller.map({n: name_key(n) for n in seller.unique()}), fk_fornecedor))
+    if from_memo:
+        _drop_stale(conn, _seller_cache, set(s_keys), SQL_SELLER_BY_IDS, lambda row: (name_key(row[0]), row[1]))
+    s_missing = {}
+    for n, key in zip(seller, s_keys):
+        if key[1] == key[1] and key not in _seller_cache:
+            s_missing.setdefault(key, n)
+    if s_missing:
+        # Seller is unique on (name, fk_fornecedor), compared case/accent-insensitively by MySQL: look the
+        # names up first and insert one row per name_key MySQL lacks (no duplicates on unmigrated DBs either)
+        names = set(s_missing.values())
+        _seller_cache.update(((name_key(n), fk), pk) for n, fk, pk in _select_in(conn, SQL_SELLER_BY_NAMES, names))
+        s_new = [{"name": n, "fk": int(fk)} for (k, fk), n in s_missing.items() if (k, fk) not in _seller_cache]
+        if s_new:
+            conn.execute(SQL_INS_SELLER, s_new)
+            _seller_cache.update(((name_key(n), fk), pk) for n, fk, pk in _select_in(conn, SQL_SELLER_BY_NAMES, names))
+
+    # names repeat across rows/files: hash each distinct one once instead of once per row
+    codes = product_codes(produto)
+    if from_memo:
+        _drop_stale(conn, _prod_cache, set(codes), SQL_PROD_BY_IDS, lambda row: row[0])
+    p_stage = pd.DataFrame({"produto": produto, "code": codes}).drop_duplicates("code")
+    p_new = p_stage[~p_stage["code"].isin(list(_prod_cache))]
+    fields = extract_product_fields_vec(p_new["produto"])
+    p_rows = pd.DataFrame({
+        "brand": fields["brand"].str[:255], "code": p_new["code"].str[:100],
+        "model": fields["model"], "var": fields["variant"],
+    }).to_dict("records")
+    if p_rows:
+        conn.execute(SQL_INS_PROD, p_rows)
+        _prod_cache.update(_select_in(conn, SQL_PROD_BY_CODES, [r["code"] for r in p_rows]))
+
+    if id_cache is not None:
+        id_cache.mark_used(set(forn_key), set(s_keys), set(codes))
+    return norm.assign(
+        fk_fornecedor=fk_fornecedor,
+        fk_seller=[_seller_cache.get(k) for k in s_keys],
+        fk_product=codes.map(_prod_cache),
+    )
+
+LIST_COLUMNS = ["url", "price", "avaliacao", "frete_price", "prazo_entrega", "created_at",
+                "fk_product", "fk_seller", "fk_fornecedor"]
+
+def build_list_frame(norm: pd.DataFrame) -> pd.DataFrame:
+    """List rows ready for to_sql (same truncation/None rules as the old per-row insert)."""
+    prazo = norm["prazo_entrega"].astype("string").str[:100]
+    return pd.DataFrame({
+        "url": norm["url"].fillna("").astype(str).str[:500],
+        "price": norm["price"],
+        "avaliacao": norm["avaliacao_val"],
+        "frete_price": norm["frete_price_val"],
+        "prazo_entrega": prazo.mask(prazo.eq("")),
+        "created_at": pd.to_datetime(norm["created_at_ts"], errors="coerce"),
+        "fk_product": norm["fk_product"].astype("int64"),
+        "fk_seller": norm["fk_seller"].astype("int64"),
+        "fk_fornecedor": norm["fk_fornecedor"].astype("int64"),
+    }, columns=LIST_COLUMNS)
+
+def _xlsx_cache_path(p: str) -> str:
+    key = hashlib.sha1(os.path.abspath(p).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(XLSX_CACHE_DIR, f"{key}_{os.path.basename(p)}.parquet")
+
+def read_input_file(p: str) -> pd.DataFrame:
+    """Reads one scrape output. Each xlsx is decoded once: a .parquet copy in XLSX_CACHE_DIR (kept
+    while newer than the xlsx) serves the next runs; CSVs go through pyarrow's multithreaded reader."""
+    if p.lower().endswith(".xlsx"):
+        cache = _xlsx_cache_path(p)
+        if USE_PYARROW and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(p):
+            try:
+                return pd.read_parquet(cache)
+            except Exception:
+                pass  # unreadable copy: decode the xlsx again and overwrite it
+        df = pd.read_excel(p, engine="openpyxl")
+        if USE_PYARROW:
+            tmp = None
+            try:
+                os.makedirs(XLSX_CACHE_DIR, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=XLSX_CACHE_DIR, suffix=".tmp")
+                os.close(fd)
+                df.to_parquet(tmp, index=False)
+                os.replace(tmp, cache)  # atomic: an interrupted write never leaves a truncated cache behind
+            except Exception:
+                # mixed-type columns arrow can't store (or no writable cache dir): just skip the cache
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+        return df
+    if USE_PYARROW:
+        return pd.read_csv(p, sep=",", encoding="utf-8", on_bad_lines="skip", engine="pyarrow")
+    return pd.read_csv(p, sep=",", encoding="utf-8", on_bad_lines="skip")
 
 def load_all_files() -> pd.DataFrame:
     paths = []
@@ -285,22 +445,31 @@ def load_all_files() -> pd.DataFrame:
         paths.extend(glob.glob(os.path.join(input_files, pattern)))
     if not paths:
         raise SystemExit(f"Nenhum arquivo encontrado em {input_files} com padrões: {GLOBS}")
-    frames = []
-    for p in sorted(paths):
+    def _read_one(p: str) -> Optional[pd.DataFrame]:
         try:
-            if p.lower().endswith(".xlsx"):
-                df = pd.read_excel(p)
-            else:
-                df = pd.read_csv(p, sep=",", encoding="utf-8", on_bad_lines="skip")
-            frames.append(df)
+            return read_input_file(p)
         except Exception as e:
             print(f"[WARN] Falha ao ler {p}: {e}")
+            return None
+
+    # I/O + decode overlap across files; map keeps the sorted order for the concat
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as ex:
+        frames = [df for df in ex.map(_read_one, sorted(paths)) if df is not None]
     if not frames:
         raise SystemExit("Nenhum DataFrame válido foi lido.")
     df_all = pd.concat(frames, ignore_index=True)
     return df_all
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="Ingest das planilhas de scraping no MySQL.")
+    ap.add_argument("--no-cache", dest="no_cache", action="store_true",
+                    help="Não usa o cache de ids em disco (carrega as dimensões direto do MySQL).")
+    ap.add_argument("--rebuild-cache", dest="rebuild_cache", action="store_true",
+                    help="Apaga o cache de ids em disco e o recria a partir do MySQL.")
+    return ap.parse_args()
+
 def main():
+    args = parse_args()
     print("[1/5] Lendo arquivos...")
     raw = load_all_files()
     print(f"   Linhas lidas: {len(raw)}")
@@ -311,36 +480,32 @@ def main():
 
     engine = get_engine()
     print("[3/5] Conectado ao MySQL. Iniciando upserts...")
-
+    id_cache = IdCache(ID_CACHE_PATH) if ID_CACHE_PATH and not args.no_cache else None
+    if id_cache is not None and args.rebuild_cache:
+        id_cache.clear()
+    try:
+        with engine.begin() as conn:  # one transaction for all dimension inserts
+            norm = resolve_dimension_ids(conn, norm, id_cache)
+        if id_cache is not None:
+            id_cache.save()
+    finally:
+        if id_cache is not None:
+            id_cache.close()
+
+    resolved = norm[["fk_product", "fk_seller", "fk_fornecedor"]].notna().all(axis=1)
+    for idx in norm.index[~resolved]:
+        print(f"[ERRO] Linha {idx}: fornecedor/seller/produto não resolvido")
+    errs = int((~resolved).sum())
+
+    # one multi-row INSERT ... VALUES (...),(...) per BATCH_SIZE rows, all in one transaction
+    df_list = build_list_frame(norm[resolved])
     ins_ok = 0
-    errs = 0
-    for idx, row in norm.iterrows():
-        try:
-            fornecedor_name = str(row["fornecedor_name"]).strip()
-            seller_name = str(row["seller_name"]).strip() if row["seller_name"] else fornecedor_name
-            produto = str(row["produto"]).strip()
-
-            fk_fornecedor = get_or_create_fornecedor(engine, fornecedor_name)
-            fk_seller = get_or_create_seller(engine, seller_name, fk_fornecedor)
-            fk_product = get_or_create_product(engine, produto)
-
-            insert_list_row(
-                engine=engine,
-                url=row["url"] if pd.notna(row["url"]) else None,
-                price=row["price"] if pd.notna(row["price"]) else None,
-                avaliacao=row["avaliacao_val"] if pd.notna(row["avaliacao_val"]) else None,
-                frete_price=row["frete_price_val"] if pd.notna(row["frete_price_val"]) else None,
-                prazo_entrega=row["prazo_entrega"] if pd.notna(row["prazo_entrega"]) else None,
-                created_at=row["created_at_ts"] if pd.notna(row["created_at_ts"]) else None,
-                fk_product=fk_product,
-                fk_seller=fk_seller,
-                fk_fornecedor=fk_fornecedor
-            )
-            ins_ok += 1
-        except Exception as e:
-            errs += 1
-            # keep going
-            print(f"[ERRO] Linha {idx}: {e}")
+    try:
+        df_list.to_sql("List", engine, if_exists="append", index=False, method="multi", chunksize=BATCH_SIZE)
+        ins_ok = len(df_list)
+    except Exception as e:
+        errs += len(df_list)
+        print(f"[ERRO] Inserção em List: {e}")
 
     print("[4/5] Concluído.")
     print(f"   Inserções em List: {ins_ok}")
@@ -2,10 +2,12 @@ import os
 import argparse
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # só exporta PNG: backend sem GUI (antes de seaborn/pyplot)
 import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 # ============== CONFIG (env com fallback) ==============
 MYSQL_USER = os.environ.get("MYSQL_USER", "root")
@@ -19,54 +21,55 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Paleta fixa apenas para as duas lojas
 PALETTE = {"Magalu": "#1f77b4", "KaBuM!": "#ff7f0e"}
+# fornecedor como categoria de 2 valores: groupby por código inteiro em vez de hash de string
+FORNECEDOR_ORDER = ["Magalu", "KaBuM!"]
+FORNECEDOR_DTYPE = pd.CategoricalDtype(FORNECEDOR_ORDER)
+# leitura do MySQL em blocos (não materializa o join inteiro de uma vez em objetos Python)
+READ_CHUNKSIZE = 50_000
+# rótulos repetidos viram category (em cada bloco, antes do concat); valores seguem float64 (DECIMAL sem ruído de float32)
+CATEGORY_COLS = ("seller", "brand", "model", "product_code")
+NUMERIC_COLS = ("price", "frete_price", "avaliacao")
+# PNG com zlib nível 1: bem mais rápido que o padrão (6), arquivo um pouco maior
+PNG_KWARGS = {"compress_level": 1}
 
 sns.set_theme(context="notebook", style="whitegrid")
 
 # ============== Helpers ==============
-def _norm(s: str) -> str:
-    return (s or "").strip().lower()
-
-def normalize_fornecedor(name: str) -> str:
-    """Agrupa rótulos em 'Magalu', 'KaBuM!' ou mantém original (antes do filtro)."""
-    n = _norm(name)
-    if not n:
-        return "Desconhecido"
-    if "magalu" in n or "magazineluiza" in n:
-        return "Magalu"
-    if "kabum" in n:
-        return "KaBuM!"
-    return (name or "").strip() or "Desconhecido"
+def normalize_fornecedor_series(s: pd.Series) -> pd.Series:
+    """Agrupa rótulos em 'Magalu', 'KaBuM!' ou mantém o original (vazio -> 'Desconhecido'), tudo em .str/np.select."""
+    name = s.fillna("").astype(str).str.strip()
+    n = name.str.lower()
+    name = name.mask(name.eq(""), "Desconhecido")
+    return pd.Series(
+        np.select([n.str.contains("magalu|magazineluiza"), n.str.contains("kabum", regex=False)],
+                  ["Magalu", "KaBuM!"], default=name),
+        index=s.index,
+    )
 
 # ============== Conexão e carga ==============
 def get_engine():
     uri = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
     return create_engine(uri, pool_pre_ping=True)
 
-def load_denormalized_only_main():
-    """Lê e normaliza, depois mantém apenas Magalu/KaBuM!"""
-    eng = get_engine()
-    sql = """
-    SELECT
-        L.id_list, L.url, L.price, L.avaliacao, L.frete_price, L.prazo_entrega, L.created_at,
-        F.id_fornecedor, F.name AS fornecedor,
-        S.id_seller, S.name AS seller,
-        P.id_product, P.brand, P.code AS product_code, P.model, P.variante
-    FROM List L
-    JOIN Fornecedores F ON F.id_fornecedor = L.fk_fornecedor
-    JOIN Seller S ON S.id_seller = L.fk_seller
-    JOIN Products P ON P.id_product = L.fk_product
-    """
-    df = pd.read_sql(sql, eng)
+# filtro de loja feito no MySQL (mesmos trechos de normalize_fornecedor_series)
+SQL_ONLY_MAIN = "(LOWER(F.name) LIKE '%magalu%' OR LOWER(F.name) LIKE '%magazineluiza%' OR LOWER(F.name) LIKE '%kabum%')"
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=False)
-    df["date"] = df["created_at"].dt.date
-    df["frete_price"] = pd.to_numeric(df["frete_price"], errors="coerce")
-    df["price"] = pd.to_numeric(df["price"], errors="coerce")
-    df["avaliacao"] = pd.to_numeric(df["avaliacao"], errors="coerce")
+def prepare_chunk(df):
+    """Tipos, fornecedor normalizado e filtro Magalu/KaBuM! num bloco do read_sql (compacta antes do concat)."""
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=False, format="ISO8601")
+    df["date"] = df["created_at"].dt.normalize()  # datetime64 (meia-noite): agrupa como int64, não objetos date
+    for c in NUMERIC_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    # normaliza fornecedor e filtra
-    df["fornecedor"] = df["fornecedor"].astype(str).map(normalize_fornecedor)
+    # normaliza fornecedor (o WHERE já podou as outras lojas; o isin fica como garantia)
+    df["fornecedor"] = normalize_fornecedor_series(df["fornecedor"])
     df = df[df["fornecedor"].isin(["Magalu", "KaBuM!"])].copy()
+    df["fornecedor"] = df["fornecedor"].astype(FORNECEDOR_DTYPE)
+    for c in CATEGORY_COLS:
+        df[c] = df[c].astype("category")
 
     # avaliações válidas
     df.loc[~df["avaliacao"].between(0, 5, inclusive="both"), "avaliacao"] = np.nan
@@ -74,29 +77,47 @@ def load_denormalized_only_main():
     df["total_price"] = df["price"].fillna(0) + df["frete_price"].fillna(0)
     return df
 
-# ============== Filtros e utilidades ==============
-def filter_product(df, product_code=None, product_like=None):
-    d = df.copy()
+def concat_chunks(chunks):
+    """concat dos blocos já compactados sem perder as colunas category (cada bloco recebe a união das categorias)."""
+    chunks = list(chunks)
+    for c in CATEGORY_COLS:
+        cats = pd.Index(sorted({v for ch in chunks for v in ch[c].cat.categories}))
+        for ch in chunks:
+            ch[c] = ch[c].cat.set_categories(cats)
+    return pd.concat(chunks, ignore_index=True)
+
+def load_denormalized_only_main(product_code=None, product_like=None):
+    """Lê só Magalu/KaBuM! (e o produto filtrado, se houver) direto do MySQL e normaliza."""
+    eng = get_engine()
+    where, params = [SQL_ONLY_MAIN], {}
     if product_code:
-        d = d[d["product_code"] == product_code]
+        where.append("P.code = :code"); params["code"] = product_code
     if product_like:
-        like = str(product_like).strip()
-        mask = (
-            #d["brand"].astype(str).str.contains(like, case=False, na=False) |
-            d["model"].astype(str).str.contains(like, case=False, na=False)
-        )
-        d = d[mask]
-    return d
+        where.append("P.model LIKE :like"); params["like"] = f"%{_like_escape(str(product_like).strip())}%"
+    sql = """
+    SELECT
+        L.id_list, L.url, L.price, L.avaliacao, L.frete_price, L.prazo_entrega, L.created_at,
+        F.id_fornecedor, F.name AS fornecedor,
+        S.id_seller, S.name AS seller,
+        P.id_product, P.brand, P.code AS product_code, P.model, P.variante
+    FROM List L
+    JOIN Fornecedores F ON F.id_fornecedor = L.fk_fornecedor
+    JOIN Seller S ON S.id_seller = L.fk_seller
+    JOIN Products P ON P.id_product = L.fk_product
+    WHERE """ + " AND ".join(where)
+    chunks = pd.read_sql(text(sql), eng, params=params, chunksize=READ_CHUNKSIZE)
+    return concat_chunks(prepare_chunk(ch) for ch in chunks)
 
+# ============== Utilidades ==============
 def savefig(path):
     plt.tight_layout()
-    plt.savefig(path, dpi=150, bbox_inches="tight")
+    plt.savefig(path, dpi=150, bbox_inches="tight", pil_kwargs=PNG_KWARGS)
     plt.close()
 
 # ============== Gráficos (somente Magalu/KaBuM!) ==============
 def price_trend(df, by="fornecedor"):
     d = (
-        df.groupby([by, "date"], as_index=False)["price"]
+        df.groupby([by, "date"], as_index=False, observed=True)["price"]
           .mean()
           .sort_values("date")
     )
@@ -117,20 +138,21 @@ def price_trend(df, by="fornecedor"):
 
 def store_competition(df):
     d = (
-        df.groupby("fornecedor", as_index=False)["price"]
+        df.groupby("fornecedor", as_index=False, observed=True)["price"]
           .mean()
-          .loc[lambda x: x["fornecedor"].isin(["Magalu", "KaBuM!"])]
           .sort_values("price")
     )
     if d.empty:
         return None
+    # só as lojas presentes: ordem fixa sem deixar barra vazia para quem não tem dado
+    order = [f for f in FORNECEDOR_ORDER if f in set(d["fornecedor"])]
     plt.figure(figsize=(9, 6))
     sns.barplot(
         data=d,
         x="fornecedor",
         y="price",
-        order=["Magalu", "KaBuM!"] if set(d["fornecedor"])=={"Magalu","KaBuM!"} else d["fornecedor"],
-        palette=[PALETTE.get(f, "#999999") for f in d["fornecedor"]],
+        order=order,
+        palette=[PALETTE[f] for f in order],
     )
     plt.xlabel("Fornecedor")
     plt.ylabel("Preço médio (R$)")
@@ -163,20 +185,20 @@ def price_vs_rating(df):
 
 def var_pct_line(df):
     d = (
-        df.groupby(["fornecedor", "date"], as_index=False)["price"]
+        df.groupby(["fornecedor", "date"], as_index=False, observed=True)["price"]
           .mean()
           .sort_values(["fornecedor", "date"])
     )
     if d.empty:
         return None
-    d["pct_change"] = d.groupby("fornecedor")["price"].pct_change() * 100.0
+    d["pct_change"] = d.groupby("fornecedor", observed=True)["price"].pct_change() * 100.0
 
     plt.figure(figsize=(9, 6))
     ax = sns.lineplot(
         data=d, x="date", y="pct_change",
         hue="fornecedor", palette=PALETTE, marker="o"
     )
-    for fornecedor, g in d.groupby("fornecedor"):
+    for fornecedor, g in d.groupby("fornecedor", observed=True):
         g = g.dropna(subset=["pct_change"])
         if len(g) > 1:
             plt.fill_between(
@@ -199,9 +221,8 @@ def var_pct_line(df):
 
 def total_price_pie(df):
     d = (
-        df.groupby("fornecedor", as_index=False)["total_price"]
+        df.groupby("fornecedor", as_index=False, observed=True)["total_price"]
           .mean()
-          .loc[lambda x: x["fornecedor"].isin(["Magalu", "KaBuM!"])]
           .sort_values("total_price")
     )
     if d.empty:
@@ -295,7 +316,7 @@ def export_rankings(df):
     d = d[d["date"] == d["last_date"]]
 
     p_rank = (
-        d.groupby(["id_product", "brand", "model", "product_code"], as_index=False)["price"]
+        d.groupby(["id_product", "brand", "model", "product_code"], as_index=False, observed=True)["price"]
           .mean()
           .sort_values("price", ascending=True)
           .head(5)
@@ -305,7 +326,7 @@ def export_rankings(df):
 
     r = d.dropna(subset=["avaliacao"])
     r_rank = (
-        r.groupby(["id_product", "brand", "model", "product_code"], as_index=False)["avaliacao"]
+        r.groupby(["id_product", "brand", "model", "product_code"], as_index=False, observed=True)["avaliacao"]
           .mean()
           .sort_values("avaliacao", ascending=False)
           .head(5)
@@ -324,11 +345,8 @@ def parse_args():
 
 def main():
     args = parse_args()
-    df = load_denormalized_only_main()
-
-    # filtros (opcionais)
-    if args.product_code or args.product_like:
-        df = filter_product(df, args.product_code, args.product_like)
+    # filtros (opcionais) vão no WHERE da consulta
+    df = load_denormalized_only_main(args.product_code, args.product_like)
 
     print(f"[INFO] Linhas após filtro: {len(df)}")
     if df.empty:
@@ -13,12 +13,16 @@ import os
 import argparse
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # só exporta PNG: backend sem GUI (antes de seaborn/pyplot)
 import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from sqlalchemy import create_engine
+from matplotlib.lines import Line2D
+from sqlalchemy import create_engine, text
 import re
 from math import ceil
+from concurrent.futures import ProcessPoolExecutor
 
 # ============== CONFIG (env com fallback) ==============
 MYSQL_USER = os.environ.get("MYSQL_USER", "root")
@@ -30,25 +34,35 @@ MYSQL_DB   = os.environ.get("MYSQL_DB", "ecommerce_scraping")
 OUTPUT_DIR = os.environ.get("SCRAPE_OUTPUT_DIR", "./outputs")
 OUT_PROD_DIR = os.path.join(OUTPUT_DIR, "products")
 os.makedirs(OUT_PROD_DIR, exist_ok=True)
+# processos para os gráficos individuais (render/PNG é CPU; 1 = serial). Padrão pequeno: cada processo
+# importa matplotlib e recebe as fatias por pickle, então muitos workers só gastam memória
+PLOT_WORKERS = int(os.environ.get("PLOT_WORKERS", 4))
 
 # Paleta fixa Magalu/KaBuM!
 PALETTE = {"Magalu": "#1f77b4", "KaBuM!": "#ff7f0e"}
 
+# leitura do MySQL em blocos (não materializa o join inteiro de uma vez em objetos Python)
+READ_CHUNKSIZE = 50_000
+# rótulos repetidos viram category (em cada bloco, antes do concat); valores seguem float64 (DECIMAL sem ruído de float32)
+CATEGORY_COLS = ("fornecedor", "seller", "brand", "model", "product_code")
+NUMERIC_COLS = ("price", "frete_price", "avaliacao")
+# PNG com zlib nível 1: bem mais rápido que o padrão (6), arquivo um pouco maior
+PNG_KWARGS = {"compress_level": 1}
+PNG_DPI = 150  # dpi fica na própria figura: o PNG sai direto do canvas (print_png), sem passar pelo savefig
+
 sns.set_theme(context="notebook", style="whitegrid")
 
 # ============== Helpers ==============
-def _norm(s: str) -> str:
-    return (s or "").strip().lower()
-
-def normalize_fornecedor(name: str) -> str:
-    n = _norm(name)
-    if not n:
-        return "Desconhecido"
-    if "magalu" in n or "magazineluiza" in n:
-        return "Magalu"
-    if "kabum" in n:
-        return "KaBuM!"
-    return (name or "").strip() or "Desconhecido"
+def normalize_fornecedor_series(s: pd.Series) -> pd.Series:
+    """Agrupa rótulos em 'Magalu', 'KaBuM!' ou mantém o original (vazio -> 'Desconhecido'), tudo em .str/np.select."""
+    name = s.fillna("").astype(str).str.strip()
+    n = name.str.lower()
+    name = name.mask(name.eq(""), "Desconhecido")
+    return pd.Series(
+        np.select([n.str.contains("magalu|magazineluiza"), n.str.contains("kabum", regex=False)],
+                  ["Magalu", "KaBuM!"], default=name),
+        index=s.index,
+    )
 
 def slugify(s: str, max_len: int = 80) -> str:
     s = (s or "").strip()
@@ -56,14 +70,55 @@ def slugify(s: str, max_len: int = 80) -> str:
     s = re.sub(r"[\s_-]+", "-", s).strip("-")
     return s[:max_len] if s else "produto"
 
+def save_png(fig, path):
+    """1 draw por figura: margens já fixadas (sem bbox_inches="tight") e PNG gravado direto pelo canvas Agg."""
+    fig.canvas.print_png(path, pil_kwargs=PNG_KWARGS)
+
 # ============== Conexão e carga ==============
 def get_engine():
     uri = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
     return create_engine(uri, pool_pre_ping=True)
 
-def load_denormalized_only_main():
-    """Lê do MySQL, normaliza e mantém apenas Magalu/KaBuM!"""
+# filtro de loja feito no MySQL (mesmos trechos de normalize_fornecedor_series)
+SQL_ONLY_MAIN = "(LOWER(F.name) LIKE '%magalu%' OR LOWER(F.name) LIKE '%magazineluiza%' OR LOWER(F.name) LIKE '%kabum%')"
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def prepare_chunk(df):
+    """Tipos, fornecedor normalizado e filtro Magalu/KaBuM! num bloco do read_sql (compacta antes do concat)."""
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=False, format="ISO8601")
+    df["date"] = df["created_at"].dt.date
+    for c in NUMERIC_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    df["fornecedor"] = normalize_fornecedor_series(df["fornecedor"])
+    df = df[df["fornecedor"].isin(["Magalu", "KaBuM!"])].copy()
+    for c in CATEGORY_COLS:
+        df[c] = df[c].astype("category")
+
+    df.loc[~df["avaliacao"].between(0, 5, inclusive="both"), "avaliacao"] = np.nan
+    df["total_price"] = df["price"].fillna(0) + df["frete_price"].fillna(0)
+    return df
+
+def concat_chunks(chunks):
+    """concat dos blocos já compactados sem perder as colunas category (cada bloco recebe a união das categorias)."""
+    chunks = list(chunks)
+    for c in CATEGORY_COLS:
+        cats = pd.Index(sorted({v for ch in chunks for v in ch[c].cat.categories}))
+        for ch in chunks:
+            ch[c] = ch[c].cat.set_categories(cats)
+    return pd.concat(chunks, ignore_index=True)
+
+def load_denormalized_only_main(product_code=None, product_like=None):
+    """Lê só Magalu/KaBuM! (e o produto filtrado, se houver) direto do MySQL e normaliza."""
     eng = get_engine()
+    where, params = [SQL_ONLY_MAIN], {}
+    if product_code:
+        where.append("P.code = :code"); params["code"] = product_code
+    if product_like:
+        where.append("(P.brand LIKE :like OR P.model LIKE :like)")
+        params["like"] = f"%{_like_escape(str(product_like).strip())}%"
     sql = """
     SELECT
         L.id_list, L.url, L.price, L.avaliacao, L.frete_price, L.prazo_entrega, L.created_at,
@@ -74,76 +129,101 @@ def load_denormalized_only_main():
     JOIN Fornecedores F ON F.id_fornecedor = L.fk_fornecedor
     JOIN Seller S ON S.id_seller = L.fk_seller
     JOIN Products P ON P.id_product = L.fk_product
-    """
-    df = pd.read_sql(sql, eng)
-
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=False)
-    df["date"] = df["created_at"].dt.date
-    df["frete_price"] = pd.to_numeric(df["frete_price"], errors="coerce")
-    df["price"] = pd.to_numeric(df["price"], errors="coerce")
-    df["avaliacao"] = pd.to_numeric(df["avaliacao"], errors="coerce")
-
-    df["fornecedor"] = df["fornecedor"].astype(str).map(normalize_fornecedor)
-    df = df[df["fornecedor"].isin(["Magalu", "KaBuM!"])].copy()
-
-    df.loc[~df["avaliacao"].between(0, 5, inclusive="both"), "avaliacao"] = np.nan
-    df["total_price"] = df["price"].fillna(0) + df["frete_price"].fillna(0)
-    return df
+    WHERE """ + " AND ".join(where)
+    chunks = pd.read_sql(text(sql), eng, params=params, chunksize=READ_CHUNKSIZE)
+    return concat_chunks(prepare_chunk(ch) for ch in chunks)
+
+# ============== Agregação (1 passada para todos os produtos) ==============
+def daily_price_by_product(df):
+    """Preço médio diário por (produto, fornecedor) num único groupby, indexado por id_product."""
+    agg = (
+        df.groupby(["id_product", "fornecedor", "date"], as_index=False, observed=True, sort=False)["price"].mean()
+        .sort_values(["id_product", "fornecedor", "date"])
+    )
+    return agg.set_index("id_product", drop=False)
 
-# ============== Filtros ==============
-def filter_product(df, product_code=None, product_like=None):
-    d = df.copy()
-    if product_code:
-        d = d[d["product_code"] == product_code]
-    if product_like:
-        like = str(product_like).strip()
-        mask = (
-            d["brand"].astype(str).str.contains(like, case=False, na=False) |
-            d["model"].astype(str).str.contains(like, case=False, na=False)
-        )
-        d = d[mask]
-    return d
+def product_slice(agg, pid):
+    """Linhas de um produto no agregado (lookup no índice, sem varrer o DataFrame)."""
+    return agg.loc[[pid]] if pid in agg.index else agg.iloc[0:0]
 
 # ============== Plot por produto ==============
-def plot_product_timeline(df, pid, brand, model, code, min_days=2):
-    """Gera um único gráfico (linha) para o produto, com preço médio diário por fornecedor."""
-    d = (
-        df[df["id_product"] == pid]
-        .groupby(["fornecedor", "date"], as_index=False)["price"].mean()
-        .sort_values(["fornecedor", "date"])
-    )
+def draw_price_lines(ax, d):
+    """Uma linha por fornecedor direto no Axes (sem o overhead do sns.lineplot); d já vem ordenado por data."""
+    for fornecedor, g in d.groupby("fornecedor", observed=True):
+        ax.plot(g["date"], g["price"], marker="o", color=PALETTE.get(fornecedor), label=fornecedor)
+
+def plot_product_timeline(agg, pid, brand, model, code, min_days=2, ax=None):
+    """Gera um único gráfico (linha) para o produto, com preço médio diário por fornecedor (agg = daily_price_by_product).
+    Com ax, reaproveita a figura dele (limpa o Axes e não fecha a figura)."""
+    d = product_slice(agg, pid)
     if d["date"].nunique() < min_days:
         return None
 
-    plt.figure(figsize=(10, 6))
-    ax = sns.lineplot(data=d, x="date", y="price", hue="fornecedor", palette=PALETTE, marker="o")
+    own_fig = ax is None
+    if own_fig:
+        fig, ax = plt.subplots(figsize=(10, 6), dpi=PNG_DPI)
+    else:
+        fig = ax.figure; ax.cla()
+    draw_price_lines(ax, d)
     ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=4, maxticks=8))
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
-    plt.xticks(rotation=45, ha="right")
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
 
     title_brand = (brand or "").strip(); title_model = (model or "").strip()
     title = f"{title_brand} {title_model}".strip() or "Produto"
-    plt.title(f"Variação temporal do preço — {title}")
-    plt.xlabel("Data"); plt.ylabel("Preço médio (R$)"); plt.legend(title=""); plt.tight_layout()
+    ax.set_title(f"Variação temporal do preço — {title}")
+    ax.set_xlabel("Data"); ax.set_ylabel("Preço médio (R$)"); ax.legend(title="")
+    fig.subplots_adjust(left=0.08, right=0.98, top=0.92, bottom=0.18)  # margens fixas: sem o solver do tight_layout
 
     slug = slugify(f"{title_brand}-{title_model}-{code}")
     out_path = os.path.join(OUT_PROD_DIR, f"{slug}.png")
-    plt.savefig(out_path, dpi=150, bbox_inches="tight"); plt.close()
+    save_png(fig, out_path)
+    if own_fig: plt.close(fig)
     return out_path
 
-def plot_all_products(df, max_products=None, min_days=2):
+_proc_ax = None  # figura reaproveitada dentro de cada processo do pool
+
+def _render_product(task):
+    """Tarefa do pool: recebe só a fatia agregada do produto e desenha na figura do processo."""
+    global _proc_ax
+    d, pid, brand, model, code, min_days = task
+    if _proc_ax is None:
+        _proc_ax = plt.subplots(figsize=(10, 6), dpi=PNG_DPI)[1]
+    return plot_product_timeline(d, pid, brand, model, code, min_days=min_days, ax=_proc_ax)
+
+def plot_all_products(df, max_products=None, min_days=2, workers=PLOT_WORKERS):
     outs = []
+    # id_product já determina marca/modelo/code: 1 groupby linear em vez do drop_duplicates de 4 colunas
     prods = (
-        df[["id_product", "brand", "model", "product_code"]]
-        .drop_duplicates()
+        df.groupby("id_product", observed=True, sort=False)
+        .agg(brand=("brand", "first"), model=("model", "first"), product_code=("product_code", "first"))
+        .reset_index()
         .sort_values(["brand", "model", "product_code"])
     )
     if max_products is not None:
         prods = prods.head(int(max_products))
 
-    for _, r in prods.iterrows():
-        out = plot_product_timeline(df, r["id_product"], r["brand"], r["model"], r["product_code"], min_days=min_days)
-        if out: outs.append(out)
+    agg = daily_price_by_product(df)
+    # só as fatias que vão virar gráfico (é o que atravessa o pickle para os processos)
+    tasks = []
+    for pid, brand, model, code in prods.itertuples(index=False, name=None):
+        d = product_slice(agg, pid)
+        if d["date"].nunique() >= min_days:
+            tasks.append((d, pid, brand, model, code, min_days))
+
+    workers = min(int(workers or 1), len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            outs = [o for o in ex.map(_render_product, tasks) if o]
+        return outs
+
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=PNG_DPI)  # 1 figura para todos os produtos (cla() entre eles)
+    try:
+        for d, pid, brand, model, code, _ in tasks:
+            out = plot_product_timeline(d, pid, brand, model, code, min_days=min_days, ax=ax)
+            if out: outs.append(out)
+    finally:
+        plt.close(fig)
     return outs
 
 # ============== Top 5 em um único gráfico (grid) ==============
@@ -156,38 +236,36 @@ def pick_top5_products(df, min_days=2):
     meta = (
         df[df["id_product"].isin(top)][["id_product","brand","model","product_code"]].drop_duplicates()
     )
-    return top, {row["id_product"]:(row["brand"], row["model"], row["product_code"]) for _, row in meta.iterrows()}
+    return top, {pid: (brand, model, code) for pid, brand, model, code in meta.itertuples(index=False, name=None)}
 
 def plot_top5_products_grid(df, min_days=2):
     ids, meta = pick_top5_products(df, min_days=min_days)
     if not ids: return None
 
     n = len(ids); rows = (n + 2) // 3; cols = min(3, n)
-    fig, axes = plt.subplots(rows, cols, figsize=(5*cols, 3.8*rows), squeeze=False, sharex=False, sharey=False)
+    fig, axes = plt.subplots(rows, cols, figsize=(5*cols, 3.8*rows), dpi=PNG_DPI, squeeze=False, sharex=False, sharey=False)
     axes = axes.flatten()
 
+    agg = daily_price_by_product(df[df["id_product"].isin(ids)])
     for i, pid in enumerate(ids):
         ax = axes[i]
-        d = (
-            df[df["id_product"] == pid]
-            .groupby(["fornecedor", "date"], as_index=False)["price"].mean()
-            .sort_values(["fornecedor", "date"])
-        )
+        d = product_slice(agg, pid)
         brand, model, code = meta.get(pid, ("", "", ""))
         title = f"{(brand or '').strip()} {(model or '').strip()}".strip() or "Produto"
 
-        sns.lineplot(data=d, x="date", y="price", hue="fornecedor", palette=PALETTE, marker="o", ax=ax, legend=False)
+        draw_price_lines(ax, d)
         ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=3, maxticks=6))
         ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
         ax.set_title(title, fontsize=11); ax.set_xlabel(""); ax.set_ylabel("R$")
 
-    handles, labels = axes[0].get_legend_handles_labels()
-    fig.legend(handles, ["Magalu", "KaBuM!"], loc="upper center", ncol=2, frameon=False)
+    handles = [Line2D([], [], color=c, marker="o", label=f) for f, c in PALETTE.items()]
+    for ax in axes[n:]: ax.set_visible(False)
+    fig.legend(handles=handles, loc="upper center", bbox_to_anchor=(0.5, 0.95), ncol=2, frameon=False)
     fig.suptitle("Top 5 produtos — variação temporal do preço (Magalu x KaBuM!)", fontsize=14, y=0.98)
-    fig.tight_layout(rect=[0, 0, 1, 0.95])
+    fig.tight_layout(rect=[0, 0, 1, 0.90])
 
     out_path = os.path.join(OUTPUT_DIR, "top5_produtos_timeline.png")
-    fig.savefig(out_path, dpi=150, bbox_inches="tight"); plt.close(fig)
+    save_png(fig, out_path); plt.close(fig)
     return out_path
 
 # ============== CLI/MAIN ==============
@@ -196,14 +274,14 @@ def parse_args():
     ap.add_argument("--like", dest="product_like", default=None, help="Filtro por substring (marca/modelo), ex.: 'iPhone 15'.")
     ap.add_argument("--code", dest="product_code", default=None, help="Filtro por código exato do produto (Products.code).")
     ap.add_argument("--max-products", type=int, default=None, help="Limita a quantidade de produtos a plotar individualmente.")
+    ap.add_argument("--workers", type=int, default=PLOT_WORKERS, help="Processos para os gráficos individuais (1 = serial).")
     ap.add_argument("--min-days", type=int, default=2, help="Mínimo de datas para desenhar timelines (padrão=2).")
     return ap.parse_args()
 
 def main():
     args = parse_args()
-    df = load_denormalized_only_main()
-    if args.product_code or args.product_like:
-        df = filter_product(df, args.product_code, args.product_like)
+    # filtros (opcionais) vão no WHERE da consulta
+    df = load_denormalized_only_main(args.product_code, args.product_like)
 
     print(f"[INFO] Linhas após filtro: {len(df)}")
     if df.empty:
@@ -213,7 +291,7 @@ def main():
     if grid_png: print("[Top 5] ", grid_png)
     else: print("[Top 5] Sem produtos com dias suficientes.")
 
-    outs = plot_all_products(df, max_products=args.max_products, min_days=args.min_days)
+    outs = plot_all_products(df, max_products=args.max_products, min_days=args.min_days, workers=args.workers)
     print("[Individuais]")
     if outs:
         for o in outs: print(" ", o)
@@ -6,14 +6,38 @@ SCRAPE -> NORMALIZAÇÃO -> MYSQL
 - Normaliza os campos e insere no MySQL no esquema solicitado (Fornecedores, Seller, Products, List)
 """
 
-import os, re, time, random, sys, json, math, hashlib, warnings, argparse
+import os, re, time, random, sys, json, hashlib, warnings, argparse, threading, csv, sqlite3, zlib, unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Tuple
-from datetime import datetime
 from urllib.parse import urlparse
 
 import pandas as pd
+import requests
 from bs4 import BeautifulSoup
+import soupsieve as sv  # motor CSS do bs4 (seletores compilados 1x no import)
+try:
+    import lxml  # parser em C para o BeautifulSoup
+    HTML_PARSER = 'lxml'
+except Exception:
+    HTML_PARSER = 'html.parser'
+try:
+    import pyarrow as pa  # leitura/escrita colunar (csv/parquet)
+    from pyarrow import csv as pa_csv
+    USE_PYARROW = True
+except Exception:
+    USE_PYARROW = False
+try:
+    import xlsxwriter  # writer de xlsx bem mais leve que o openpyxl (só escrita)
+    EXCEL_ENGINE = 'xlsxwriter'
+except Exception:
+    EXCEL_ENGINE = None  # pandas escolhe (openpyxl)
+try:
+    import orjson  # decoder JSON em Rust (JSON-LD)
+    json_loads = orjson.loads
+except Exception:
+    json_loads = json.loads
 
 # Selenium (para o scraping)
 from selenium import webdriver
@@ -31,8 +55,8 @@ except Exception:
     USE_WDM = False
 
 # SQLAlchemy (para inserir no MySQL)
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Connection, Engine
 
 # =========================
 # CONFIG (env com fallback)
@@ -44,19 +68,67 @@ MYSQL_PORT = os.environ.get("MYSQL_PORT", "3306")
 MYSQL_DB   = os.environ.get("MYSQL_DB", "ecommerce_scraping")
 
 CEP_DEFAULT = "14401-426"  # usado para cálculo de frete quando possível
+INGEST_BATCH = 1000        # linhas de List por executemany (limita o tamanho de cada INSERT multi-VALUES)
+
+# Paralelismo do scraping: 1 Chrome por worker; com SELENIUM_GRID_URL os drivers são remotos (Grid)
+SCRAPE_WORKERS   = int(os.environ.get("SCRAPE_WORKERS", "4"))
+SELENIUM_GRID_URL = os.environ.get("SELENIUM_GRID_URL", "")
+
+# Fast path sem navegador (requests); o Selenium só entra quando o HTML estático não traz preço
+STATIC_TIMEOUT = float(os.environ.get("SCRAPE_STATIC_TIMEOUT", "15"))
+CACHE_DB       = os.environ.get("SCRAPE_CACHE_DB", "")                # sqlite com o HTML por URL ('' = sem cache)
+CACHE_TTL_S    = float(os.environ.get("SCRAPE_CACHE_TTL", "3600"))
+PAGE_WAIT_S    = float(os.environ.get("SCRAPE_PAGE_WAIT", "5"))    # espera máx. pelo preço/JSON-LD no Selenium
+PAGE_POLL_S    = 0.1                                               # intervalo de checagem da espera (padrão do Selenium: 0.5 s)
+POLITE_DELAY_S = float(os.environ.get("SCRAPE_DELAY", "0.5"))      # pausa entre URLs do mesmo worker (+ jitter)
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
 
 # =========================
 # REGEX e seletores básicos
 # =========================
-CURRENCY_RE = re.compile(r"R\$\s*\d{1,3}(?:\.\d{3})*,\d{2}")
 NUMBER_RE   = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{2}")
 RATING_RE   = re.compile(r"(\d+[.,]\d+)\s*(?:/|de)?\s*5")
-COUNT_RE    = re.compile(r"(\d{1,3}(?:\.\d{3})*)")
+COUNT_RE    = re.compile(r"(?<!\d)(\d{1,3}(?:\.\d{3})+|\d+)(?!\d)")  # '1.234' ou '1234' inteiros (ancorado)
+WS_RE       = re.compile(r"\s+")
+URL_RE      = re.compile(r"https?://")
+SELLER_RE   = re.compile(r"Vendido(?: e entregue)? por[: ]+([A-Za-z0-9\-\._\s]+)", re.I)
+RATING_NUM_RE = re.compile(r"^\d+[.,]\d+$")
+PRICE_CLEAN_RE = re.compile(r"R\$|\.|\s")                      # 'R$', pontos de milhar e espaços numa passada só
+AVAL_SCALE_RE  = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:de|/)\s*5\b")  # '4,5 de 5' / '4.5/5'
+AVAL_NUM_RE    = re.compile(r"\b(\d+(?:[.,]\d+)?)\b")
+SLUG_NONWORD_RE = re.compile(r"[^\w\s-]", re.UNICODE)
+SLUG_SEP_RE     = re.compile(r"[\s_-]+")
+STORAGE_RE      = re.compile(r"\b(\d{2,4}\s?GB)\b", re.IGNORECASE)
+COLOR_RE        = re.compile(r"\b(preto|black|azul|blue|verde|green|branco|white|cinza|gray|graphite|violet|violeta|pink|rosa)\b", re.IGNORECASE)
+MODEL_SPLIT_RE  = re.compile(r"[-|,(]")
+WORD_RE         = re.compile(r"\w+")
+BR_NUM_TABLE  = str.maketrans({'.': '', ',': '.'})   # '1.234,56' -> '1234.56' numa passada só
+BRL_FMT_TABLE = str.maketrans({',': '.', '.': ','})  # '1,234.56' -> '1.234,56'
 
 SELECTORS_PRICE_MAGALU = ['[data-testid="price-value"]','[data-testid="price-big"]','[data-testid="price-amount"]','[class*="Price"]','[itemprop="price"]']
 SELECTORS_PRICE_KABUM  = ['[data-testid="product-price"]','span.finalPrice','h4.finalPrice','.priceCard strong','[itemprop="price"]']
 SELECTORS_PRICE_COMMON = ['[itemprop="price"]','[data-testid*="price"]','[class*="price"]']
 
+# seletores por domínio, em ordem de prioridade
+SELECTORS_PRICE_BY_SITE = {
+    'magalu': list(dict.fromkeys(SELECTORS_PRICE_MAGALU + SELECTORS_PRICE_COMMON)),
+    'kabum':  list(dict.fromkeys(SELECTORS_PRICE_KABUM + SELECTORS_PRICE_COMMON)),
+    '':       SELECTORS_PRICE_COMMON,
+}
+# união por domínio (1 único soup.select por página em vez de 1 por seletor)
+SELECTORS_PRICE_UNION = {k: ', '.join(v) for k, v in SELECTORS_PRICE_BY_SITE.items()}
+SEL_PRICE_COMPILED = {k: sv.compile(v) for k, v in SELECTORS_PRICE_UNION.items()}
+# cada seletor compilado à parte só para rotular (preco_debug) qual deles casou com o candidato
+SEL_PRICE_EACH = {k: [(f'sel:{sel}', sv.compile(sel)) for sel in v] for k, v in SELECTORS_PRICE_BY_SITE.items()}
+
+# trecho do domínio -> chave do site (seletores) e fornecedor padrão quando a página não informa
+SITE_KEYS   = (('magalu', 'magalu'), ('magazineluiza', 'magalu'), ('kabum', 'kabum'))
+SITE_SELLER = {'magalu': 'Magalu', 'kabum': 'KaBuM!'}
+JSONLD_RE = re.compile(r'<script[^>]+type=["\']?application/ld\+json["\']?[^>]*>(.*?)</script>', re.I | re.S)
+
+# sinal de "página pronta" para o WebDriverWait (JSON-LD ou algum elemento de preço)
+SELECTOR_PAGE_READY = ', '.join(['script[type="application/ld+json"]'] + SELECTORS_PRICE_COMMON)
+
 SELECTORS_CEP_INPUT = [
     'input[name*="cep"]','input[id*="cep"]','input[placeholder*="CEP"]','input[aria-label*="CEP"]',
     'input[name*="zip"]','input[id*="zip"]','input[placeholder*="Código postal"]','input[aria-label*="zip"]'
@@ -68,50 +140,50 @@ SELECTORS_CEP_INPUT = [
 def slugify(s: str, max_len: int = 100) -> str:
     """Gera um 'code' curto, minúsculo e sem acentos para chaves únicas."""
     s = s.strip().lower()
-    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE)
-    s = re.sub(r"[\s_-]+", "-", s).strip("-")
+    s = SLUG_NONWORD_RE.sub("", s)
+    s = SLUG_SEP_RE.sub("-", s).strip("-")
     return s[:max_len]
 
-def parse_price(value) -> Optional[float]:
-    """Converte diversos formatos de preço BR em float (ou None)."""
-    if value is None or (isinstance(value, float) and math.isnan(value)):
-        return None
-    if isinstance(value, (int, float)):
-        return round(float(value), 2)
-    s = str(value).strip().replace("R$", "").replace(".", "").replace(" ", "").replace(",", ".")
-    try:
-        return round(float(s), 2)
-    except:
-        return None
-
-def parse_avaliacao(value) -> Optional[float]:
-    """Extrai nota 0..5 de strings como '4,5 de 5' ou '4.5/5'. Se inválida, retorna None."""
-    if value is None or (isinstance(value, float) and math.isnan(value)):
-        return None
-    s = str(value).strip().lower()
-
-    # contagem de avaliações (ex.: '27 avaliações') não é nota
-    if "avaliaç" in s and ("de 5" not in s and "/5" not in s):
-        return None
-
-    m = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:de|/)\s*5\b", s)
-    if m:
-        try:
-            v = float(m.group(1).replace(",", "."))
-            return round(v, 2) if 0 <= v <= 5 else None
-        except:
-            return None
-
-    m = re.search(r"\b(\d+(?:[.,]\d+)?)\b", s)
-    if m:
-        try:
-            v = float(m.group(1).replace(",", "."))
-            return round(v, 2) if 0 <= v <= 5 else None
-        except:
-            return None
-    return None
+def name_key(s: str) -> str:
+    """Chave de comparação equivalente ao collation do MySQL (utf8mb4_0900_ai_ci): ignora caixa e acentos."""
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(c for c in s if not unicodedata.combining(c)).casefold()
+
+def parse_price_series(s: pd.Series) -> pd.Series:
+    """Converte preços BR em float: coluna numérica vai direto no to_numeric, texto pelos métodos .str (em C);
+    coluna object com tipos misturados é separada em números e textos, cada parte pelo seu caminho."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return pd.to_numeric(s, errors="coerce").round(2)
+    if pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+        is_txt = s.map(type).eq(str)
+        num = pd.to_numeric(s.where(~is_txt), errors="coerce").round(2)
+        return num.where(~is_txt, parse_price_series(s.where(is_txt)))
+    txt = s.str.replace(PRICE_CLEAN_RE, "", regex=True).str.replace(",", ".", regex=False)
+    return pd.to_numeric(txt, errors="coerce").round(2)
+
+def parse_avaliacao_series(s: pd.Series) -> pd.Series:
+    """Extrai nota 0..5 ('x de 5' / 'x/5' primeiro, senão um número solto); contagens como '27 avaliações' viram NaN."""
+    txt = s.astype(str).str.strip().str.lower()
+    so_contagem = (txt.str.contains("avaliaç", regex=False)
+                   & ~txt.str.contains("de 5", regex=False) & ~txt.str.contains("/5", regex=False))
+    raw = txt.str.extract(AVAL_SCALE_RE, expand=False)
+    raw = raw.fillna(txt.str.extract(AVAL_NUM_RE, expand=False))
+    v = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+    return v.where(v.between(0, 5) & ~so_contagem).round(2)
+
+def parse_created_at(s: pd.Series) -> pd.Series:
+    """data_coleta -> Timestamp: formato ISO direto (o scraper grava '%Y-%m-%d %H:%M:%S'); só os valores
+    que falharem passam pela inferência de formato do pandas."""
+    ts = pd.to_datetime(s, errors="coerce", format="ISO8601")
+    bad = ts.isna() & s.notna()
+    if bad.any():
+        ts.loc[bad] = pd.to_datetime(s[bad], errors="coerce")
+    return ts
 
 BRANDS = ["Apple","Samsung","Motorola","Xiaomi","Nokia","Asus","Google","Sony","LG","Realme","OnePlus","Huawei","Infinix","OPPO","Vivo","Lenovo"]
+# toda marca é uma palavra \w+ só: "\bmarca\b" == "marca está entre as palavras do nome" -> 1 tokenização + lookups em set;
+# (marca, minúscula, regex do split do modelo) compilados 1x, na ordem de prioridade de BRANDS
+BRAND_INFO = tuple((b, b.lower(), re.compile(rf"\b{re.escape(b)}\b", re.IGNORECASE)) for b in BRANDS)
 
 def extract_product_fields(produto: str) -> Tuple[str, str, str]:
     """Heurística simples para marca / modelo / variante (armazenamento/cor)."""
@@ -120,23 +192,22 @@ def extract_product_fields(produto: str) -> Tuple[str, str, str]:
     brand = "Desconhecida"
     p = produto.strip()
 
-    found = None
-    for b in BRANDS:
-        if re.search(rf"\b{re.escape(b)}\b", p, flags=re.IGNORECASE):
-            found = b; break
+    # primeira marca (na ordem de BRANDS) presente no nome
+    words = set(WORD_RE.findall(p.lower()))
+    found, found_rx = next(((b, rx) for b, low, rx in BRAND_INFO if low in words), (None, None))
     if found: brand = found
 
     variant_parts = []
-    storage = re.findall(r"\b(\d{2,4}\s?GB)\b", p, flags=re.IGNORECASE)
-    if storage: variant_parts.append(storage[0].upper())
-    color = re.findall(r"\b(preto|black|azul|blue|verde|green|branco|white|cinza|gray|graphite|violet|violeta|pink|rosa)\b", p, flags=re.IGNORECASE)
-    if color: variant_parts.append(color[0].capitalize())
+    storage = STORAGE_RE.search(p)
+    if storage: variant_parts.append(storage.group(1).upper())
+    color = COLOR_RE.search(p)
+    if color: variant_parts.append(color.group(1).capitalize())
     variant = " ".join(dict.fromkeys(variant_parts)) if variant_parts else ""
 
     model = p
     if found:
-        model = re.split(rf"\b{re.escape(found)}\b", p, flags=re.IGNORECASE, maxsplit=1)[-1].strip()
-    model = re.split(r"[-|,(]", model)[0].strip()
+        model = found_rx.split(p, maxsplit=1)[-1].strip()
+    model = MODEL_SPLIT_RE.split(model, maxsplit=1)[0].strip()
     if not model or len(model) < 3: model = p
     return (brand[:255], model[:255], variant[:255])
 
@@ -156,15 +227,15 @@ def normalize_scrape_df(df: pd.DataFrame) -> pd.DataFrame:
 
     # preço
     if "price_num" in df.columns:
-        df["price"] = df["price_num"].apply(parse_price)
+        df["price"] = parse_price_series(df["price_num"])
     else:
-        df["price"] = df.get("preco_texto", pd.Series([None]*len(df))).apply(parse_price)
+        df["price"] = parse_price_series(df.get("preco_texto", pd.Series([None]*len(df))))
 
     # avaliação (0..5)
-    df["avaliacao_val"] = df.get("avaliacao", pd.Series([None]*len(df))).apply(parse_avaliacao)
+    df["avaliacao_val"] = parse_avaliacao_series(df.get("avaliacao", pd.Series([None]*len(df))))
 
     # frete
-    df["frete_price_val"] = df.get("frete_price", pd.Series([None]*len(df))).apply(parse_price)
+    df["frete_price_val"] = parse_price_series(df.get("frete_price", pd.Series([None]*len(df))))
 
     # fornecedor/seller
     df["fornecedor_name"] = df.get("fornecedor") if "fornecedor" in df.columns else df.get("fonte_coluna")
@@ -174,7 +245,7 @@ def normalize_scrape_df(df: pd.DataFrame) -> pd.DataFrame:
     if "created_at" in df.columns:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            df["created_at_ts"] = pd.to_datetime(df["created_at"], errors="coerce")
+            df["created_at_ts"] = parse_created_at(df["created_at"])
     else:
         df["created_at_ts"] = pd.Timestamp.utcnow()
 
@@ -183,185 +254,216 @@ def normalize_scrape_df(df: pd.DataFrame) -> pd.DataFrame:
         if k not in df.columns: df[k] = None
     out = df[keep].copy()
     out = out.dropna(subset=["produto","fornecedor_name"], how="any")
+    out["product_code"] = product_codes(out["produto"])
     return out
 
 # =========================
 # DB Helpers (MySQL)
 # =========================
+@lru_cache(maxsize=1)
 def get_engine() -> Engine:
-    """Cria engine SQLAlchemy para o MySQL."""
+    """Engine SQLAlchemy para o MySQL, criada 1x por processo (o pool de conexões é reaproveitado)."""
     uri = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
     return create_engine(uri, pool_pre_ping=True)
 
-def get_or_create_fornecedor(engine: Engine, name: str) -> int:
-    """Upsert simples de fornecedor (usa code=slug como chave)."""
-    code = slugify(name or "desconhecido")
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT id_fornecedor FROM Fornecedores WHERE code=:code"), {"code": code}).fetchone()
-        if row: return row[0]
-        conn.execute(text("INSERT INTO Fornecedores (name, code) VALUES (:name, :code)"),
-                     {"name": (name or "Desconhecido")[:255], "code": code[:100]})
-        row = conn.execute(text("SELECT id_fornecedor FROM Fornecedores WHERE code=:code"), {"code": code}).fetchone()
-        return row[0]
-
-def get_or_create_seller(engine: Engine, name: str, fk_fornecedor: int) -> int:
-    """Upsert simples de seller por par (name, fornecedor)."""
-    with engine.begin() as conn:
-        row = conn.execute(text("""SELECT id_seller FROM Seller WHERE name=:n AND fk_fornecedor=:f"""),
-                           {"n": (name or "Desconhecido")[:255], "f": fk_fornecedor}).fetchone()
-        if row: return row[0]
-        conn.execute(text("INSERT INTO Seller (name, fk_fornecedor) VALUES (:n, :f)"),
-                     {"n": (name or "Desconhecido")[:255], "f": fk_fornecedor})
-        row = conn.execute(text("""SELECT id_seller FROM Seller WHERE name=:n AND fk_fornecedor=:f"""),
-                           {"n": (name or "Desconhecido")[:255], "f": fk_fornecedor}).fetchone()
-        return row[0]
-
-def get_or_create_product(engine: Engine, produto: str) -> int:
-    """Upsert simples de produto por code (hash do nome normalizado)."""
-    brand, model, variant = extract_product_fields(produto or "")
-    norm = re.sub(r"\s+", " ", (produto or "").strip().lower())
-    code_raw = hashlib.sha1(norm.encode("utf-8")).hexdigest()[:20]
-    code = f"p_{code_raw}"
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT id_product FROM Products WHERE code=:code"), {"code": code}).fetchone()
-        if row: return row[0]
-        conn.execute(text("""INSERT INTO Products (brand, code, model, variante) 
-                             VALUES (:b,:c,:m,:v)"""),
-                     {"b": brand[:255], "c": code[:100], "m": model[:255], "v": variant[:255]})
-        row = conn.execute(text("SELECT id_product FROM Products WHERE code=:code"), {"code": code}).fetchone()
-        return row[0]
-
-def insert_list_row(engine: Engine, url: Optional[str], price: Optional[float], avaliacao: Optional[float],
-                    frete_price: Optional[float], prazo_entrega: Optional[str], created_at, 
-                    fk_product: int, fk_seller: int, fk_fornecedor: int) -> None:
-    """Insere uma linha em List (FKs já resolvidas)."""
-    with engine.begin() as conn:
-        conn.execute(text("""INSERT INTO List 
-            (url, price, avaliacao, frete_price, prazo_entrega, created_at, fk_product, fk_seller, fk_fornecedor)
-            VALUES (:url, :price, :aval, :frete, :prazo, :created, :p, :s, :f)"""),
-            {"url": (url or "")[:500],
-             "price": price if price is not None else None,
-             "aval":  avaliacao if (avaliacao is not None and 0 <= avaliacao <= 5) else None,
-             "frete": frete_price if frete_price is not None else None,
-             "prazo": (prazo_entrega or "")[:100] if prazo_entrega else None,
-             "created": pd.to_datetime(created_at) if created_at is not None else None,
-             "p": fk_product, "s": fk_seller, "f": fk_fornecedor})
+# statements montados 1x no import; quem chama passa a Connection e controla a transação
+SQL_INSERT_SELLER = text("INSERT INTO Seller (name, fk_fornecedor) VALUES (:n, :f)")
+# ingest em lote: upsert nos codes UNIQUE; Seller segue por consulta + insert dos pares ausentes
+# (funciona também em bancos ainda sem o uk_seller_name_fornecedor)
+SQL_UPSERT_FORN = text("""INSERT INTO Fornecedores (name, code) VALUES (:name, :code)
+                          ON DUPLICATE KEY UPDATE id_fornecedor=id_fornecedor""")
+SQL_UPSERT_PROD = text("""INSERT INTO Products (brand, code, model, variante) VALUES (:b, :c, :m, :v)
+                          ON DUPLICATE KEY UPDATE id_product=id_product""")
+SQL_FORN_IDS   = text("SELECT code, id_fornecedor FROM Fornecedores WHERE code IN :keys").bindparams(bindparam("keys", expanding=True))
+SQL_SELLER_IDS = text("SELECT name, fk_fornecedor, id_seller FROM Seller WHERE name IN :keys").bindparams(bindparam("keys", expanding=True))
+SQL_PROD_IDS   = text("SELECT code, id_product FROM Products WHERE code IN :keys").bindparams(bindparam("keys", expanding=True))
+SQL_INSERT_LIST = text("""INSERT INTO List 
+    (url, price, avaliacao, frete_price, prazo_entrega, created_at, fk_product, fk_seller, fk_fornecedor)
+    VALUES (:url, :price, :aval, :frete, :prazo, :created, :p, :s, :f)""")
+
+def product_codes(produtos: pd.Series) -> pd.Series:
+    """Code estável do produto (sha1 do nome normalizado): normaliza com .str e calcula o sha1 1x por nome distinto."""
+    norm = produtos.fillna("").astype(str).str.strip().str.lower().str.replace(WS_RE, " ", regex=True)
+    uniq = norm.drop_duplicates()
+    return norm.map(dict(zip(uniq, ("p_" + hashlib.sha1(n.encode("utf-8")).hexdigest()[:20] for n in uniq))))
+
+def resolve_fks(conn: Connection, norm: pd.DataFrame) -> pd.DataFrame:
+    """Cria (em lote) fornecedores/sellers/produtos que faltam e devolve norm com fk_fornecedor/fk_seller/fk_product."""
+    forn = norm["fornecedor_name"].astype(str).str.strip()
+    has_seller = norm["seller_name"].notna() & norm["seller_name"].astype(str).str.strip().ne("")
+    seller = norm["seller_name"].where(has_seller, forn).astype(str).str.strip()
+    produto = norm["produto"].astype(str).str.strip()
+    f_code = forn.map({n: slugify(n or "desconhecido") for n in forn.unique()})
+    s_name = seller.where(seller.ne(""), "Desconhecido").str[:255]
+    p_code = norm["product_code"]
+
+    # Fornecedores: 1 executemany + 1 SELECT; o code volta do banco como foi gravado e o IN casa sem
+    # caixa/acento ('eletrônicos' acha 'eletronicos'), então o mapa também usa name_key
+    f = pd.DataFrame({"name": forn.where(forn.ne(""), "Desconhecido").str[:255], "code": f_code.str[:100]}).drop_duplicates("code")
+    conn.execute(SQL_UPSERT_FORN, f.to_dict("records"))
+    ids_f = {name_key(code): pk for code, pk in conn.execute(SQL_FORN_IDS, {"keys": list(f["code"])}).fetchall()}
+    fk_fornecedor = f_code.map({c: ids_f.get(name_key(c[:100])) for c in f_code.unique()})
+
+    # Seller: busca pelos nomes e insere só os pares (nome, fornecedor) ausentes. O IN do MySQL compara
+    # sem caixa/acento, então o casamento usa name_key: 'LOJA X' acha o 'Loja X' do banco e variações
+    # no mesmo lote geram 1 insert só (senão o uk_seller_name_fornecedor derruba a transação inteira)
+    keys = list(zip(s_name.map({n: name_key(n) for n in s_name.unique()}), fk_fornecedor))
+    names = list(s_name.unique())
+    seller_ids = lambda: {(name_key(n), fk): pk for n, fk, pk in conn.execute(SQL_SELLER_IDS, {"keys": names}).fetchall()}
+    ids_s = seller_ids()
+    novos = {}
+    for n, (k, fk) in zip(s_name, keys):
+        if fk == fk and (k, fk) not in ids_s: novos.setdefault((k, fk), {"n": n, "f": int(fk)})
+    if novos:
+        conn.execute(SQL_INSERT_SELLER, list(novos.values()))
+        ids_s = seller_ids()
+
+    # Products: heurística de marca/modelo só 1x por produto distinto
+    prods = []
+    for code, nome in dict(zip(p_code, produto)).items():
+        brand, model, variant = extract_product_fields(nome)
+        prods.append({"b": brand[:255], "c": code[:100], "m": model[:255], "v": variant[:255]})
+    conn.execute(SQL_UPSERT_PROD, prods)
+    ids_p = dict(conn.execute(SQL_PROD_IDS, {"keys": [r["c"] for r in prods]}).fetchall())
+
+    return norm.assign(fk_fornecedor=fk_fornecedor, fk_seller=[ids_s.get(k) for k in keys], fk_product=p_code.map(ids_p))
+
+def list_rows(norm: pd.DataFrame) -> list:
+    """Parâmetros do INSERT em List (FKs já resolvidas), com NaN/NaT -> None."""
+    aval = norm["avaliacao_val"]
+    prazo = norm["prazo_entrega"].astype("string").str[:100]
+    out = pd.DataFrame({
+        "url": norm["url"].fillna("").astype(str).str[:500],
+        "price": norm["price"],
+        "aval": aval.where(aval.between(0, 5)),
+        "frete": norm["frete_price_val"],
+        "prazo": prazo.mask(prazo.eq("")),
+        "created": pd.to_datetime(norm["created_at_ts"], errors="coerce"),
+        "p": norm["fk_product"], "s": norm["fk_seller"], "f": norm["fk_fornecedor"],
+    })
+    out = out.astype(object).where(out.notna(), None)
+    for c in ("p", "s", "f"): out[c] = out[c].map(int)
+    out["created"] = pd.Series([t if t is None else t.to_pydatetime() for t in out["created"]], index=out.index, dtype=object)
+    return out.to_dict("records")
 
 def ingest_dataframe(df: pd.DataFrame):
-    """Normaliza o DataFrame de scraping e insere no MySQL."""
+    """Normaliza o DataFrame de scraping e insere no MySQL em lote (1 transação, executemany por tabela;
+    List em fatias de INGEST_BATCH linhas)."""
     norm = normalize_scrape_df(df)
+    if norm.empty:
+        print("[INGEST] Inseridos: 0 | Erros: 0"); return
     eng = get_engine()
     ins_ok = errs = 0
-    for _, row in norm.iterrows():
-        try:
-            fk_fornecedor = get_or_create_fornecedor(eng, str(row["fornecedor_name"]).strip())
-            fk_seller     = get_or_create_seller(eng, str(row["seller_name"]).strip() if row["seller_name"] else str(row["fornecedor_name"]).strip(), fk_fornecedor)
-            fk_product    = get_or_create_product(eng, str(row["produto"]).strip())
-            insert_list_row(eng,
-                            url=row["url"] if pd.notna(row["url"]) else None,
-                            price=row["price"] if pd.notna(row["price"]) else None,
-                            avaliacao=(row["avaliacao_val"] if pd.notna(row["avaliacao_val"]) else None),
-                            frete_price=(row["frete_price_val"] if pd.notna(row["frete_price_val"]) else None),
-                            prazo_entrega=(row["prazo_entrega"] if pd.notna(row["prazo_entrega"]) else None),
-                            created_at=(row["created_at_ts"] if pd.notna(row["created_at_ts"]) else None),
-                            fk_product=fk_product, fk_seller=fk_seller, fk_fornecedor=fk_fornecedor)
-            ins_ok += 1
-        except Exception as e:
-            errs += 1
-            print(f"[ERRO][ingest] {type(e).__name__}: {e}")
+    try:
+        with eng.begin() as conn:
+            norm = resolve_fks(conn, norm)
+            ok = norm[["fk_fornecedor", "fk_seller", "fk_product"]].notna().all(axis=1)
+            errs = int((~ok).sum())
+            if errs: print(f"[ERRO][ingest] {errs} linha(s) sem fornecedor/seller/produto resolvido")
+            rows = list_rows(norm[ok])
+            for i in range(0, len(rows), INGEST_BATCH):
+                conn.execute(SQL_INSERT_LIST, rows[i:i + INGEST_BATCH])
+            ins_ok = len(rows)
+    except Exception as e:
+        errs, ins_ok = len(norm), 0
+        print(f"[ERRO][ingest] {type(e).__name__}: {e}")
     print(f"[INGEST] Inseridos: {ins_ok} | Erros: {errs}")
 
 # =========================
 # SCRAPING (SIMPLES e ROBUSTO)
 # =========================
-def clean_text(s): return re.sub(r"\s+", " ", str(s or "")).strip()
-
-def br_to_float(txt):
-    m = NUMBER_RE.search(txt or "")
-    if not m: return None
-    num = m.group(0).replace('.', '').replace(',', '.')
-    try: return float(num)
-    except: return None
+def clean_text(s): return WS_RE.sub(" ", str(s or "")).strip()
 
 def norm_price_str(txt):
     m = NUMBER_RE.search(txt or "")
     return f"R$ {m.group(0)}" if m else ""
 
-def extract_jsonld_all(soup):
+def parse_br_price(txt):
+    """Texto de preço e valor numérico com uma única busca de regex: ('R$ 1.234,56', 1234.56) ou ('', None)."""
+    m = NUMBER_RE.search(txt or "")
+    if not m: return '', None
+    num = m.group(0)
+    return f"R$ {num}", float(num.translate(BR_NUM_TABLE))
+
+def _decode_jsonld(raws):
     vals = []
-    for tag in soup.find_all('script', type='application/ld+json'):
+    for raw in raws:
+        if not raw or not raw.strip(): continue
         try:
-            data = json.loads(tag.string or '')
+            data = json_loads(raw)
         except Exception:
             continue
+        if isinstance(data, dict) and isinstance(data.get('@graph'), list):
+            data = data['@graph']  # schema.org agrupado: Product/Offer ficam dentro do @graph
         if isinstance(data, list): vals.extend(data)
         else: vals.append(data)
     return vals
 
-def jsonld_prices(soup):
+def extract_jsonld_from_html(html: str):
+    """Lê todos os blocos JSON-LD direto do HTML bruto (regex), sem árvore bs4; chame 1x por página e repasse."""
+    return _decode_jsonld(m.group(1) for m in JSONLD_RE.finditer(html))
+
+def _fmt_brl(f: float) -> str:
+    return "R$ " + format(f, ',.2f').translate(BRL_FMT_TABLE)
+
+def jsonld_prices(ld):
     """Extrai possíveis preços de JSON-LD (quando sites expõem schema.org)."""
-    out = []
-    for obj in extract_jsonld_all(soup):
-        try:
-            offers = obj.get('offers') if isinstance(obj, dict) else None
-            if not offers: continue
-            if isinstance(offers, list):
-                iters = offers
-            else:
-                iters = [offers]
-            for o in iters:
-                for key in ('price','lowPrice','highPrice'):
-                    v = o.get(key) if isinstance(o, dict) else None
-                    if isinstance(v,(int,float,str)): out.append(str(v))
-        except Exception:
-            pass
     normed = []
-    for v in out:
-        if ',' in str(v) and NUMBER_RE.search(str(v)):
-            normed.append(norm_price_str(str(v)))
-        else:
-            try:
-                f = float(v)
-                br = f"R$ {f:,.2f}".replace(',', 'X').replace('.', ',').replace('X','.')
-                normed.append(br)
-            except Exception:
-                pass
+    for obj in ld:
+        offers = obj.get('offers') if isinstance(obj, dict) else None
+        if not offers: continue
+        for o in (offers if isinstance(offers, list) else [offers]):
+            if not isinstance(o, dict): continue
+            for key in ('price','lowPrice','highPrice'):
+                v = o.get(key)
+                if isinstance(v, bool): continue
+                if isinstance(v, (int, float)):
+                    normed.append(_fmt_brl(float(v)))  # número nativo: sem str()/regex
+                elif isinstance(v, str):
+                    if ',' in v and NUMBER_RE.search(v):
+                        normed.append(norm_price_str(v))
+                    else:
+                        try: normed.append(_fmt_brl(float(v)))
+                        except ValueError: pass
     return normed
 
-def collect_dom_prices(soup, domain_hint=''):
-    """Coleta candidatos a preço via CSS (prioriza seletores por domínio)."""
-    sel_list = []
-    if 'magalu' in domain_hint or 'magazineluiza' in domain_hint: sel_list.extend(SELECTORS_PRICE_MAGALU)
-    if 'kabum' in domain_hint: sel_list.extend(SELECTORS_PRICE_KABUM)
-    sel_list.extend(SELECTORS_PRICE_COMMON)
+def site_key(netloc: str) -> str:
+    """'magalu' / 'kabum' / '' a partir do domínio (já em minúsculas)."""
+    for frag, key in SITE_KEYS:
+        if frag in netloc: return key
+    return ''
 
+def collect_dom_prices(soup, key=''):
+    """Coleta candidatos a preço via CSS com os seletores do site (key = site_key() do domínio, já resolvida)."""
     cands = []
-    for sel in sel_list:
-        for el in soup.select(sel):
-            txt = clean_text(el.get_text(' '))
-            if not txt: continue
-            if not (CURRENCY_RE.search(txt) or NUMBER_RE.search(txt)): continue
-            cands.append((txt, f'sel:{sel}'))
+    for el in SEL_PRICE_COMPILED[key].select(soup):
+        raw = el.get_text(' ')
+        # NUMBER_RE não depende de espaços: filtra no texto cru e só limpa quem vira candidato
+        if not NUMBER_RE.search(raw): continue
+        # motivo = 1º seletor (em prioridade) que casa com o elemento; match só nos poucos candidatos
+        reason = next((r for r, pat in SEL_PRICE_EACH[key] if pat.match(el)), f'sel:{key or "common"}')
+        cands.append((clean_text(raw), reason))
     return cands
 
-def pick_best_price(cands):
-    """Escolhe o melhor candidato por menor valor e presença de 'R$'."""
+def pick_best_price(cands, debug: bool = False):
+    """Escolhe o melhor candidato por menor valor e presença de 'R$'.
+    Com debug, devolve também os 5 primeiros candidatos formatados."""
     normed = []
     for txt, reason in cands:
-        price_str = norm_price_str(txt); price_num = br_to_float(price_str)
-        if price_str and price_num is not None:
+        price_str, price_num = parse_br_price(txt)
+        if price_num is not None:
             normed.append((price_str, price_num, reason))
-    if not normed: return '', None, []
+    if not normed: return '', None, ()
     normed.sort(key=lambda x: (x[1], x[2]))
     best = normed[0]
-    debug = [f"{p} | {v} | {r}" for (p, v, r) in normed[:5]]
-    return best[0], best[1], debug
+    if not debug: return best[0], best[1], ()
+    return best[0], best[1], [f"{p} | {v} | {r}" for (p, v, r) in normed[:5]]
 
-def extract_jsonld_rating_and_count(soup):
+def extract_jsonld_rating_and_count(ld):
     """Tenta capturar nota média e quantidade de avaliações do JSON-LD."""
     rating_val = ''
     count_val = None
-    for obj in extract_jsonld_all(soup):
+    for obj in ld:
         try:
             ar = obj.get('aggregateRating') if isinstance(obj, dict) else None
             if isinstance(ar, dict):
@@ -376,12 +478,13 @@ def extract_jsonld_rating_and_count(soup):
                         if m: count_val = int(m.group(1).replace('.', ''))
         except Exception:
             pass
+        if rating_val and count_val is not None: break
     return rating_val, count_val
 
 def normalize_rating(r: str) -> str:
     """Formata nota em 'X,X de 5' quando possível."""
     r = clean_text(r)
-    m = re.search(r"^\d+[.,]\d+$", r or '')
+    m = RATING_NUM_RE.search(r or '')
     if m:
         val = m.group(0).replace('.', ','); return f"{val} de 5"
     m2 = RATING_RE.search(r or '')
@@ -390,89 +493,236 @@ def normalize_rating(r: str) -> str:
     return r or ''
 
 # ------ Selenium helpers ------
-def _build_options(headless=True):
+def _build_options(headless=True, need_js=True):
     opts = Options()
     if headless: opts.add_argument('--headless=new')
+    # 'eager' devolve o driver.get no DOMContentLoaded (não espera assets tardios)
+    opts.page_load_strategy = 'eager'
+    prefs = {
+        'profile.default_content_setting_values.plugins': 2,
+        'profile.default_content_setting_values.media_stream': 2,
+        'profile.default_content_setting_values.notifications': 2,
+        # único bloqueio de imagens: as prefs valem também no Grid (webdriver.Remote), onde não há CDP
+        'profile.managed_default_content_settings.images': 2,
+    }
+    # sem JS quando a página já traz preço/JSON-LD renderizado no servidor
+    if not need_js: prefs['profile.managed_default_content_settings.javascript'] = 2
+    opts.add_experimental_option('prefs', prefs)
     opts.add_argument('--no-sandbox'); opts.add_argument('--disable-dev-shm-usage')
     opts.add_argument('--disable-gpu'); opts.add_argument('--window-size=1366,900')
     opts.add_argument('--lang=pt-BR')
-    opts.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36')
+    opts.add_argument(f'--user-agent={USER_AGENT}')
     return opts
 
-def new_driver(headless=True):
-    opts = _build_options(headless=headless)
+# analytics/ads/CSS/fontes/mídia bloqueados no nível do protocolo (CDP) em todo driver novo
+# (documentos, XHR/fetch e scripts seguem liberados: alguns sites montam o preço via JS;
+#  imagens já ficam desligadas pelas prefs em _build_options)
+BLOCKED_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+    '*hotjar.com*', '*criteo*', '*.woff*', '*.ttf*', '*.otf*', '*/video/*', '*.mp4*', '*.webm*', '*.css*',
+]
+
+def _block_heavy_requests(driver):
+    """Bloqueia downloads e URLs de BLOCKED_URL_PATTERNS via CDP (só Chrome local)."""
+    if not hasattr(driver, 'execute_cdp_cmd'): return  # webdriver.Remote (Grid) não expõe CDP
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'deny'})
+    except WebDriverException:
+        pass
+
+@lru_cache(maxsize=1)
+def _driver_path() -> str:
+    """Chromedriver do webdriver_manager, resolvido 1x por processo (install() consulta a rede e varre o cache a cada chamada)."""
+    return ChromeDriverManager().install()
+
+def new_driver(headless=True, need_js=True):
+    opts = _build_options(headless=headless, need_js=need_js)
+    if SELENIUM_GRID_URL:
+        return webdriver.Remote(command_executor=SELENIUM_GRID_URL, options=opts)
     if USE_WDM:
         try:
-            return webdriver.Chrome(options=opts)
+            driver = webdriver.Chrome(options=opts)
         except Exception:
-            return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=opts)
-    return webdriver.Chrome(options=opts)
+            driver = webdriver.Chrome(service=Service(_driver_path()), options=opts)
+    else:
+        driver = webdriver.Chrome(options=opts)
+    _block_heavy_requests(driver)
+    return driver
+
+def new_driver_retry(headless=True, need_js=True, attempts=3):
+    """new_driver com backoff exponencial (1s, 2s, ...) quando o Chrome não sobe."""
+    for i in range(attempts):
+        try:
+            return new_driver(headless=headless, need_js=need_js)
+        except WebDriverException:
+            if i == attempts - 1: raise
+            time.sleep(2 ** i)
 
-def ensure_driver(driver, headless=True):
+def ensure_driver(driver, headless=True, need_js=True):
     try:
-        if driver is None: return new_driver(headless=headless)
+        if driver is None: return new_driver_retry(headless=headless, need_js=need_js)
         _ = driver.current_url
         return driver
     except Exception:
         try:
             if driver: driver.quit()
         except Exception: pass
-        return new_driver(headless=headless)
+        return new_driver_retry(headless=headless, need_js=need_js)
 
-def scrape_one(url: str, driver, cep: Optional[str] = None):
-    """Coleta dados principais de uma página de produto."""
-    started = datetime.now()
+def reset_driver(driver) -> bool:
+    """Limpa o estado entre URLs sem reiniciar o Chrome (cookies de todos os domínios + about:blank)."""
+    try:
+        if hasattr(driver, 'execute_cdp_cmd'):
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        else:
+            # webdriver.Remote (Grid): sem CDP; delete_all_cookies só vale para a origem atual,
+            # então precisa rodar antes de sair da página do produto
+            driver.delete_all_cookies()
+        driver.get('about:blank')
+        return True
+    except Exception:
+        return False  # sessão perdida: ensure_driver recria na próxima URL
+
+# ------ Fast path (requests) ------
+def _session():
+    """requests.Session por thread (keep-alive entre URLs do mesmo worker)."""
+    sess = getattr(_thread_local, 'session', None)
+    if sess is None:
+        sess = requests.Session()
+        sess.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8'})
+        _thread_local.session = sess
+    return sess
+
+def fetch_static(url: str, cache: Optional['PageCache'] = None) -> Tuple[str, dict]:
+    """Baixa o HTML da página sem navegador (levanta exceção em HTTP de erro) e devolve também ETag/Last-Modified.
+    Com cache, o GET é condicional: 304 reaproveita o HTML guardado, mesmo com o TTL vencido."""
+    stored = cache.get_stale(url) if cache is not None else None
+    headers = {}
+    if stored:
+        if stored[1]: headers['If-None-Match'] = stored[1]
+        if stored[2]: headers['If-Modified-Since'] = stored[2]
+    resp = _session().get(url, timeout=STATIC_TIMEOUT, headers=headers or None)
+    if resp.status_code == 304 and headers:
+        return stored[0], {'etag': stored[1], 'last_modified': stored[2]}
+    resp.raise_for_status()
+    return resp.text, {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+
+def parse_product_html(html: str, url: str, debug: bool = False) -> dict:
+    """Extrai preço, vendedor e avaliação do HTML de uma página de produto."""
+    seller = ''; rating = ''
+    # JSON-LD sai direto do HTML bruto (regex, sem bs4); decodificado 1x e
+    # reaproveitado por preço/vendedor/avaliação
+    ld = extract_jsonld_from_html(html)
+
+    # preço: JSON-LD primeiro; a árvore completa + varredura por seletores só se ele não trouxer preço válido
+    site = site_key(urlparse(url).netloc.lower())
+    price, price_num, price_debug = pick_best_price([(p, 'jsonld') for p in jsonld_prices(ld)], debug)
+    if price_num is None:
+        soup = BeautifulSoup(html, HTML_PARSER)
+        price, price_num, price_debug = pick_best_price(collect_dom_prices(soup, site), debug)
+
+    # vendedor (quando disponível no JSON-LD)
+    for obj in ld:
+        try:
+            offers = obj.get('offers') if isinstance(obj, dict) else None
+            if isinstance(offers, dict) and isinstance(offers.get('seller'), dict):
+                seller = offers['seller'].get('name') or seller
+        except Exception: pass
+    if not seller:
+        # fallback básico: procura por 'Vendido por ...'
+        m = SELLER_RE.search(html)
+        if m: seller = clean_text(m.group(1))
+    if not seller:
+        seller = SITE_SELLER.get(site, '')
+
+    # avaliação e contagem
+    r_json, c_json = extract_jsonld_rating_and_count(ld)
+    rating = normalize_rating(r_json) if r_json else rating
+
+    return {'preco': price, 'preco_num': price_num, 'fornecedor': seller,
+            'avaliacao': rating, 'avaliacoes_qtd': c_json, 'preco_debug': price_debug}
+
+# ------ Cache de páginas em disco ------
+class PageCache:
+    """HTML por URL em sqlite (zlib), válido por ttl segundos; seguro para uso entre threads.
+    Guarda também ETag/Last-Modified para revalidar páginas vencidas com GET condicional."""
+    def __init__(self, path: str, ttl: float = CACHE_TTL_S):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, html BLOB NOT NULL, fetched_at REAL NOT NULL, "
+                           "etag TEXT, last_modified TEXT)")
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        for col in ('etag', 'last_modified'):  # cache criado por versão anterior
+            if col not in cols: self._conn.execute(f"ALTER TABLE pages ADD COLUMN {col} TEXT")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT html, fetched_at FROM pages WHERE url=?", (url,)).fetchone()
+        if not row or time.time() - row[1] > self.ttl: return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def get_stale(self, url: str) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        """(html, etag, last_modified) ignorando o TTL; None se a URL não tem validador para o GET condicional."""
+        with self._lock:
+            row = self._conn.execute("SELECT html, etag, last_modified FROM pages WHERE url=?", (url,)).fetchone()
+        if not row or not (row[1] or row[2]): return None
+        return zlib.decompress(row[0]).decode('utf-8'), row[1], row[2]
+
+    def put(self, url: str, html: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        blob = zlib.compress(html.encode('utf-8'))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pages (url, html, fetched_at, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+                               (url, blob, time.time(), etag, last_modified))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock: self._conn.close()
+
+def scrape_one(url: str, driver, cep: Optional[str] = None, cache: Optional[PageCache] = None, html: Optional[str] = None,
+               debug: bool = False):
+    """Coleta dados principais de uma página de produto.
+    driver=None usa o fast path via requests; html já informado (ex.: do cache) dispensa o download.
+    preco_debug só é preenchido com debug=True."""
+    started = time.perf_counter()  # monotônico: duração correta mesmo se o relógio do sistema mudar
     status = 'ok'; erro = ''
-    price = ''; price_num = None; price_debug = []
-    seller = ''; rating = ''; count = None
+    parsed = {'preco': '', 'preco_num': None, 'fornecedor': '', 'avaliacao': '', 'avaliacoes_qtd': None, 'preco_debug': ()}
     frete_valor = ''; frete_prazo = ''; frete_metodo = ''
 
     try:
-        driver.get(url); time.sleep(0.5)
-        html = driver.page_source
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # preço (JSON-LD + seletores)
-        prices = jsonld_prices(soup)
-        cands = [(p, 'jsonld') for p in prices]
-        netloc = urlparse(url).netloc.lower()
-        hint = 'magalu' if 'magalu' in netloc or 'magazineluiza' in netloc else ('kabum' if 'kabum' in netloc else '')
-        cands += collect_dom_prices(soup, hint)
-        price, price_num, price_debug = pick_best_price(cands)
-
-        # vendedor (quando disponível no JSON-LD)
-        for obj in extract_jsonld_all(soup):
+        fetched = html is None
+        validators = {}
+        if fetched and driver is None:
+            html, validators = fetch_static(url, cache)
+        elif fetched:
+            driver.get(url)
             try:
-                offers = obj.get('offers') if isinstance(obj, dict) else None
-                if isinstance(offers, dict) and isinstance(offers.get('seller'), dict):
-                    seller = offers['seller'].get('name') or seller
-            except Exception: pass
-        if not seller:
-            # fallback básico: procura por 'Vendido por ...'
-            m = re.search(r'Vendido(?: e entregue)? por[: ]+([A-Za-z0-9\-\._\s]+)', html, flags=re.I)
-            if m: seller = clean_text(m.group(1))
-        if not seller:
-            seller = 'Magalu' if 'magalu' in netloc else ('KaBuM!' if 'kabum' in netloc else '')
-
-        # avaliação e contagem
-        r_json, c_json = extract_jsonld_rating_and_count(soup)
-        rating = normalize_rating(r_json) if r_json else rating
-        count = c_json
+                WebDriverWait(driver, PAGE_WAIT_S, poll_frequency=PAGE_POLL_S).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, SELECTOR_PAGE_READY)))
+            except TimeoutException:
+                pass  # segue com o HTML que já carregou
+            html = driver.page_source
+        parsed = parse_product_html(html, url, debug)
+        if cache is not None and fetched and parsed['preco_num'] is not None:
+            cache.put(url, html, **validators)
 
         # frete (muitos sites exigem interação, aqui mantemos simples)
         # -> opcionalmente você pode interagir com o CEP e abrir modal, se necessário.
 
     except Exception as e:
         status = 'erro'; erro = f'{type(e).__name__}: {e}'
-    finished = datetime.now()
+    elapsed = time.perf_counter() - started
 
     return {
-        'preco': price, 'preco_num': price_num, 'fornecedor': seller,
-        'avaliacao': rating, 'avaliacoes_qtd': count,
+        'preco': parsed['preco'], 'preco_num': parsed['preco_num'], 'fornecedor': parsed['fornecedor'],
+        'avaliacao': parsed['avaliacao'], 'avaliacoes_qtd': parsed['avaliacoes_qtd'],
         'frete_valor': frete_valor, 'frete_prazo': frete_prazo, 'frete_metodo': frete_metodo,
-        'data_coleta': finished.strftime('%Y-%m-%d %H:%M:%S'),
-        'duracao_s': round((finished-started).total_seconds(), 2),
-        'status': status, 'erro': erro, 'preco_debug': '; '.join(price_debug[:10]),
+        'data_coleta': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'duracao_s': round(elapsed, 2),
+        'status': status, 'erro': erro, 'preco_debug': '; '.join(parsed['preco_debug']),
     }
 
 def normalize_input_dataframe(df):
@@ -488,43 +738,131 @@ def normalize_input_dataframe(df):
     if not link_cols:
         for c in cols:
             try:
-                if df[c].astype(str).str.contains(r'https?://', na=False).any():
+                if df[c].astype(str).str.contains(URL_RE, na=False).any():
                     link_cols.append(c)
             except Exception: pass
         link_cols = list(dict.fromkeys(link_cols))
 
-    rows = []
-    for _, row in df.iterrows():
-        nome = clean_text(row.get(name_col, ''))
-        for lc in link_cols:
-            url = clean_text(row.get(lc, ''))
-            if url.startswith('http'):
-                rows.append({'produto': nome, 'url': url, 'fonte_coluna': lc})
-    return pd.DataFrame(rows)
-
-def scrape_products(input_path: str, output_excel: str, headless: bool = True, shipping_cep: Optional[str] = None):
-    """Percorre as URLs da planilha e devolve DataFrame de resultados + salva xlsx."""
-    raw = pd.read_excel(input_path)
+    if not link_cols: return pd.DataFrame(columns=['produto', 'url', 'fonte_coluna'])
+
+    # versão vetorizada de clean_text (uma coluna por vez, sem iterrows)
+    clean = lambda s: s.fillna('').astype(str).str.replace(WS_RE, ' ', regex=True).str.strip()
+    nomes = clean(df[name_col])
+    parts = [pd.DataFrame({'produto': nomes, 'url': clean(df[lc]), 'fonte_coluna': lc}) for lc in link_cols]
+    out = pd.concat(parts)
+    out = out[out['url'].str.startswith('http')]
+    # ordem original: linha a linha, colunas de link na ordem da planilha
+    return out.sort_index(kind='stable').reset_index(drop=True)
+
+# ------ Entrada/saída (formato pela extensão) ------
+def read_table(path: str) -> pd.DataFrame:
+    """Lê a planilha de entrada: .parquet, .csv ou Excel (padrão)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return pd.read_parquet(path)
+    if ext == '.csv':
+        return pd.read_csv(path, engine='pyarrow') if USE_PYARROW else pd.read_csv(path)
+    return pd.read_excel(path)
+
+def write_table(df: pd.DataFrame, path: str) -> str:
+    """Salva os resultados: .parquet (zstd), .csv ou Excel (padrão)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+    elif ext == '.csv':
+        if not (USE_PYARROW and _write_csv_arrow(df, path)):
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+    else:
+        # sem constant_memory: o pandas grava coluna a coluna e esse modo do xlsxwriter descartaria as células
+        df.to_excel(path, index=False, engine=EXCEL_ENGINE)
+    return path
+
+def _write_csv_arrow(df: pd.DataFrame, path: str) -> bool:
+    """CSV pelo writer em C do pyarrow; False se alguma coluna não converter (cai no to_csv)."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with open(path, 'wb') as fh:
+            fh.write(b'\xef\xbb\xbf')  # BOM, igual ao utf-8-sig do pandas (Excel abre os acentos certo)
+            pa_csv.write_csv(table, fh)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return False  # o to_csv do pandas sobrescreve o arquivo parcial
+    return True
+
+# ------ Pool de drivers (1 por thread) ------
+_thread_local = threading.local()
+_drivers_lock = threading.Lock()
+_drivers = []
+
+def ensure_driver_and_get(headless=True, need_js=True):
+    """Devolve o driver da thread atual, criando/recriando quando necessário."""
+    drv = getattr(_thread_local, 'driver', None)
+    if drv is not None and getattr(_thread_local, 'driver_ok', False):
+        return drv  # o reset_driver da URL anterior já provou que a sessão responde (sem o round-trip do current_url)
+    new = ensure_driver(drv, headless=headless, need_js=need_js)
+    if new is not drv:
+        _thread_local.driver = new
+        with _drivers_lock: _drivers.append(new)
+    return new
+
+def quit_all_drivers():
+    with _drivers_lock:
+        drivers = list(_drivers); _drivers.clear()
+    for d in drivers:
+        try: d.quit()
+        except Exception: pass
+
+def _scrape_one(url, cep, headless, static_first=True, need_js=True, cache=None, debug=False):
+    """Worker: cache -> HTML estático -> navegador da thread, parando no primeiro que achar preço."""
+    cached = cache.get(url) if cache is not None else None
+    data = scrape_one(url, None, cep=cep, html=cached, debug=debug) if cached else None
+    if data is not None and data['preco_num'] is not None:
+        return data  # sem rede: sem pausa
+    if static_first:
+        data = scrape_one(url, None, cep=cep, cache=cache, debug=debug)
+    if data is None or data['preco_num'] is None:
+        driver = ensure_driver_and_get(headless=headless, need_js=need_js)
+        data = scrape_one(url, driver, cep=cep, cache=cache, debug=debug)
+        _thread_local.driver_ok = reset_driver(driver)
+    if POLITE_DELAY_S > 0: time.sleep(POLITE_DELAY_S + random.random()*POLITE_DELAY_S)  # polidez
+    return data
+
+RESULT_COLUMNS = [
+    'produto', 'url', 'fonte_coluna', 'preco', 'preco_num', 'fornecedor', 'avaliacao', 'avaliacoes_qtd',
+    'frete_valor', 'frete_prazo', 'frete_metodo', 'data_coleta', 'duracao_s', 'status', 'erro', 'preco_debug',
+]
+
+def scrape_products(input_path: str, output_excel: str, headless: bool = True, shipping_cep: Optional[str] = None,
+                    workers: int = SCRAPE_WORKERS, static_first: bool = True, need_js: bool = True,
+                    stream_csv: Optional[str] = None, cache: Optional[PageCache] = None, debug: bool = False):
+    """Percorre as URLs da planilha (em paralelo) e devolve DataFrame de resultados + salva xlsx/csv/parquet.
+    Com stream_csv, cada linha também é gravada (e 'flushed') nesse CSV assim que fica pronta."""
+    raw = read_table(input_path)
     items = normalize_input_dataframe(raw)
     if items.empty: raise RuntimeError('Nenhum link válido encontrado.')
-    driver = None
+    cep = shipping_cep or CEP_DEFAULT
     results = []
+    fh = open(stream_csv, 'w', newline='', encoding='utf-8-sig') if stream_csv else None
     try:
-        driver = ensure_driver(driver, headless=headless)
-        for _, r in items.iterrows():
-            produto = r['produto']; url = r['url']; fonte = r['fonte_coluna']
-            data = scrape_one(url, driver, cep=shipping_cep or CEP_DEFAULT)
-            results.append({
-                'produto': produto, 'url': url, 'fonte_coluna': fonte,
-                **data
-            })
-            time.sleep(0.5 + random.random()*0.7)  # polidez
+        writer = csv.DictWriter(fh, fieldnames=RESULT_COLUMNS, extrasaction='ignore') if fh else None
+        if writer: writer.writeheader()
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
+            # cada URL é coletada 1x por execução, mesmo repetida em várias linhas/colunas;
+            # executor.map preserva a ordem de 1ª ocorrência, então next() casa com a linha atual
+            work = lambda u: _scrape_one(u, cep, headless, static_first, need_js, cache, debug)
+            pending = ex.map(work, items['url'].drop_duplicates())
+            seen = {}
+            for r in items.itertuples(index=False):
+                data = seen.get(r.url)
+                if data is None:
+                    data = seen[r.url] = next(pending)
+                rec = {'produto': r.produto, 'url': r.url, 'fonte_coluna': r.fonte_coluna, **data}
+                results.append(rec)
+                if writer: writer.writerow(rec); fh.flush()
     finally:
-        try:
-            if driver is not None: driver.quit()
-        except Exception: pass
-    out = pd.DataFrame(results)
-    out.to_excel(output_excel, index=False)
+        quit_all_drivers()
+        if fh: fh.close()
+    out = pd.DataFrame.from_records(results, columns=RESULT_COLUMNS)
+    write_table(out, output_excel)
     return out, output_excel
 
 # =========================
@@ -532,19 +870,35 @@ def scrape_products(input_path: str, output_excel: str, headless: bool = True, s
 # =========================
 def parse_args():
     ap = argparse.ArgumentParser(description="Scraping + Ingest em MySQL (pipeline único).")
-    ap.add_argument("--in", dest="in_path", default="produtos.xlsx", help="Planilha de entrada com nomes/URLs (xlsx).")
-    ap.add_argument("--out-xlsx", dest="out_xlsx", default="produtos_scrape.xlsx", help="Arquivo Excel de saída.")
+    ap.add_argument("--in", dest="in_path", default="produtos.xlsx", help="Planilha de entrada com nomes/URLs (xlsx, csv ou parquet).")
+    ap.add_argument("--out-xlsx", dest="out_xlsx", default="produtos_scrape.xlsx", help="Arquivo de saída (xlsx, csv ou parquet, pela extensão).")
+    ap.add_argument("--out-csv", dest="out_csv", default=None, help="CSV gravado linha a linha durante a coleta (parcial se o processo cair).")
+    ap.add_argument("--cache", dest="cache", default=CACHE_DB, help="Arquivo sqlite de cache do HTML por URL (vazio = sem cache).")
+    ap.add_argument("--cache-ttl", dest="cache_ttl", type=float, default=CACHE_TTL_S, help="Validade do cache em segundos (padrão 3600).")
     ap.add_argument("--headless", dest="headless", default="1", help="1/0 para rodar sem interface (padrão 1).")
     ap.add_argument("--cep", dest="cep", default=CEP_DEFAULT, help="CEP para cálculo de frete (quando aplicável).")
+    ap.add_argument("--workers", dest="workers", type=int, default=SCRAPE_WORKERS, help="Qtd. de navegadores em paralelo (padrão 4).")
+    ap.add_argument("--static", dest="static", default="1", help="1/0 para tentar antes o HTML estático via requests (padrão 1).")
+    ap.add_argument("--js", dest="js", default="1", help="1/0 para habilitar JavaScript no Chrome (0 = só HTML do servidor).")
+    ap.add_argument("--debug", dest="debug", action="store_true", help="Preenche a coluna preco_debug com os candidatos de preço.")
     return ap.parse_args()
 
 def main():
     args = parse_args()
     headless = str(args.headless).lower() in ("1","true","yes","y")
+    static_first = str(args.static).lower() in ("1","true","yes","y")
+    need_js = str(args.js).lower() in ("1","true","yes","y")
+
+    cache = PageCache(args.cache, ttl=args.cache_ttl) if args.cache else None
 
     print("[SCRAPE] Iniciando scraping...")
-    df, xlsx = scrape_products(args.in_path, args.out_xlsx, headless=headless, shipping_cep=args.cep)
-    print(f"[SCRAPE] Linhas coletadas: {len(df)} | Excel: {xlsx}")
+    try:
+        df, xlsx = scrape_products(args.in_path, args.out_xlsx, headless=headless, shipping_cep=args.cep,
+                                   workers=args.workers, static_first=static_first, need_js=need_js,
+                                   stream_csv=args.out_csv, cache=cache, debug=args.debug)
+    finally:
+        if cache is not None: cache.close()
+    print(f"[SCRAPE] Linhas coletadas: {len(df)} | Saída: {xlsx}")
 
     print("[INGEST] Normalizando e inserindo no MySQL...")
     ingest_dataframe(df)